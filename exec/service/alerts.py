@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable
+
+from commons.utils.EmailAlert import send_email
+
+logger = logging.getLogger(__name__)
+
+ALERT_WINDOW = 300
+
+
+class AlertDispatcher:
+    """
+    Queues alerts to a background sender so the caller (e.g. a websocket callback) never waits on email.
+    The first alert for an (acct, subject) is sent right away; repeats within the window are held & sent as a
+    single digest once the window elapses i.e. at most one email per (acct, subject) per window.
+    Till start is called alerts are sent synchronously; stop flushes the pending alerts & digests.
+    """
+
+    def __init__(self, send: Callable = send_email, window: float = ALERT_WINDOW):
+        self.send = send
+        self.window = window
+        self.cond = threading.Condition()
+        self.pending = deque()
+        self.last_sent = {}
+        self.digests = {}
+        self.running = False
+        self.thread = None
+        self.stats = {'received': 0, 'sent': 0, 'suppressed': 0, 'digests': 0, 'errors': 0}
+
+    def __send(self, subject: str, body: str):
+        try:
+            self.send(body=body, subject=subject)
+            self.stats['sent'] += 1
+        except Exception as ex:
+            self.stats['errors'] += 1
+            logger.exception(f"AlertDispatcher: Error sending {subject}: {ex}")
+
+    def alert(self, subject: str, body: str, acct: str = None):
+        key = (acct, subject)
+        now = time.time()
+        with self.cond:
+            self.stats['received'] += 1
+            last_sent = self.last_sent.get(key)
+            if last_sent is not None and now - last_sent < self.window:
+                self.digests.setdefault(key, []).append(body)
+                self.stats['suppressed'] += 1
+                return
+            self.last_sent[key] = now
+            if self.running:
+                self.pending.append((subject, body))
+                self.cond.notify()
+                return
+        self.__send(subject, body)
+
+    def __digest(self, key, bodies: list):
+        subject = f"{key[1]} ({len(bodies)} repeats)"
+        lines = [body if count == 1 else f"{body} (x{count})" for body, count in Counter(bodies).items()]
+        return subject, f"{len(bodies)} alerts in the last {self.window}s:\n" + "\n".join(lines)
+
+    def __collect(self, force: bool = False):
+        """
+        Pending alerts & the digests whose window has elapsed (all if force); to be called under the lock
+        """
+        now = time.time()
+        alerts = list(self.pending)
+        self.pending.clear()
+        for key in list(self.digests.keys()):
+            if force or now - self.last_sent[key] >= self.window:
+                alerts.append(self.__digest(key, self.digests.pop(key)))
+                self.last_sent[key] = now
+                self.stats['digests'] += 1
+        return alerts
+
+    def __next_due(self):
+        if len(self.digests) == 0:
+            return None
+        return max(0.0, min(self.last_sent[key] for key in self.digests) + self.window - time.time())
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.pending) == 0:
+                    due = self.__next_due()
+                    if due is not None and due <= 0:
+                        break
+                    self.cond.wait(due)
+                if not self.running:
+                    break
+                alerts = self.__collect()
+            for subject, body in alerts:
+                self.__send(subject, body)
+
+    def flush(self):
+        """
+        Sends all the pending alerts & digests on the caller's thread
+        """
+        with self.cond:
+            alerts = self.__collect(force=True)
+        for subject, body in alerts:
+            self.__send(subject, body)
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.__run, name="AlertDispatcher", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.flush()
+        logger.info(f"AlertDispatcher: Stats {self.stats}")
@@ -0,0 +1,102 @@
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from commons.config.reader import cfg
+
+logger = logging.getLogger(__name__)
+
+PARAMS_DATASET = 'params'
+TRADES_DATASET = 'trades'
+MTM_DATASET = 'trades_mtm'
+RECON_DATASET = 'recon'
+
+PARTITION_COLS = ['trade_date', 'acct', 'trade_type']
+ARCHIVE_PATH_ENV = 'ARCHIVE_PATH'
+
+
+def get_archive_path():
+    path = os.environ.get(ARCHIVE_PATH_ENV)
+    if path is None:
+        path = os.path.join(cfg['generated'], 'archive')
+    return path
+
+
+def _arrow_safe(df: pd.DataFrame):
+    """
+    Object columns with mixed values (e.g. statuses post fillna(0)) as str - Parquet needs one type per column
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            df[col] = df[col].map(lambda val: val if val is None or val != val else str(val))
+    return df
+
+
+class TradeArchive:
+    """
+    Columnar (Parquet) archive of the COB outputs, hive partitioned as
+    <dataset>/trade_date=<date>/acct=<acct>/trade_type=<type>/part-0.parquet
+    A partition is re-written as a whole i.e. re-running COB for a day / acct replaces it.
+    read pushes the filters down to the partitions (directory pruning) & the row groups, and only reads the columns
+    asked for.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+
+    @property
+    def root(self):
+        if self.path is None:
+            self.path = get_archive_path()
+        return self.path
+
+    def partition_path(self, dataset: str, trade_date: str, acct: str, trade_type: str = 'NA'):
+        return os.path.join(self.root, dataset, f"trade_date={trade_date}", f"acct={acct}",
+                            f"trade_type={trade_type}")
+
+    def write(self, dataset: str, data: pd.DataFrame, trade_date: str, acct: str, trade_type: str = 'NA'):
+        path = self.partition_path(dataset, str(trade_date), acct, trade_type)
+        data = data.drop(columns=[col for col in PARTITION_COLS if col in data.columns])
+        table = pa.Table.from_pandas(_arrow_safe(data), preserve_index=False)
+        # '_' prefixed paths are skipped by the readers
+        tmp_path = os.path.join(os.path.dirname(path), f"_tmp-{os.path.basename(path)}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        pq.write_table(table, os.path.join(tmp_path, 'part-0.parquet'))
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+        logger.info(f"TradeArchive: Archived {len(data)} {dataset} rows to {path}")
+        return path
+
+    def safe_write(self, dataset: str, data: pd.DataFrame, trade_date: str, acct: str, trade_type: str = 'NA'):
+        """
+        write for the COB path - the DB is the system of record so an archive failure is only logged
+        """
+        try:
+            return self.write(dataset, data, trade_date, acct, trade_type)
+        except Exception as ex:
+            logger.exception(f"TradeArchive: Unable to archive {dataset} for {acct} & {trade_date}: {ex}")
+            return None
+
+    def read(self, dataset: str, columns: list = None, filters: list = None):
+        """
+        Args:
+            dataset: PARAMS_DATASET, TRADES_DATASET, MTM_DATASET or RECON_DATASET
+            columns: Columns to read (partition columns included) - all if None
+            filters: pyarrow DNF filters e.g. [('acct', '=', 'Trader-V2-Pralhad'), ('trade_date', '>=', '2024-01-01')]
+
+        Returns: DataFrame; empty if nothing is archived yet
+
+        """
+        path = os.path.join(self.root, dataset)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns)
+        partitioning = ds.partitioning(
+            pa.schema([(col, pa.string()) for col in PARTITION_COLS]), flavor='hive')
+        table = pq.read_table(path, columns=columns, filters=filters, partitioning=partitioning)
+        return table.to_pandas()
@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Priority classes - lower is served first
+SQUARE_OFF = 0
+ENTRY = 1
+SL_TRAIL = 2
+DIAGNOSTIC = 3
+PRIORITY_NAMES = {SQUARE_OFF: 'SQUARE_OFF', ENTRY: 'ENTRY', SL_TRAIL: 'SL_TRAIL', DIAGNOSTIC: 'DIAGNOSTIC'}
+
+METHOD_PRIORITY = {
+    'api_close_bracket_order': SQUARE_OFF,
+    'api_place_order': ENTRY,
+    'api_modify_order': SL_TRAIL,
+    'is_sl_update_rejected': DIAGNOSTIC,
+    'api_get_order_book': DIAGNOSTIC
+}
+
+# Broker allows ~10 requests / sec per session
+RATE = 10.0
+BURST = 10
+# Low priority calls are shed once these many calls are already waiting
+SHED_QUEUE_DEPTH = {SL_TRAIL: 20}
+# Only calls which are safe to drop i.e. an SL trail is re-requested on the next tick. A shed call returns None which
+# the callers of the others (order book, SL modify order history) would take as "no orders" / fail on.
+SHEDDABLE_METHODS = {'api_modify_order'}
+
+
+class _Waiter:
+    __slots__ = ['priority', 'key', 'state', 'start']
+
+    def __init__(self, priority, key):
+        self.priority = priority
+        self.key = key
+        self.state = 'WAITING'
+        self.start = time.time()
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket shared by all the callers of an account's broker session.
+    Waiting calls are granted tokens strictly in priority order (FIFO within a priority).
+    Under pressure, low priority calls are shed & keyed SL trail calls are coalesced i.e. a newer modify for
+    the same order supersedes the one still waiting.
+    """
+
+    def __init__(self, rate: float = RATE, burst: int = BURST, shed_queue_depth: dict = None):
+        self.rate = rate
+        self.burst = burst
+        self.shed_queue_depth = SHED_QUEUE_DEPTH if shed_queue_depth is None else shed_queue_depth
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.cond = threading.Condition()
+        self.queue = []
+        self.keyed = {}
+        self.counter = itertools.count()
+        self.stats = {name: {'granted': 0, 'shed': 0, 'coalesced': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+                      for name in PRIORITY_NAMES.values()}
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def __grant(self, waiter: _Waiter):
+        self.tokens -= 1
+        waited = time.time() - waiter.start
+        stats = self.stats[PRIORITY_NAMES[waiter.priority]]
+        stats['granted'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        return True
+
+    def __waiting(self):
+        return len([entry for entry in self.queue if entry[2].state == 'WAITING'])
+
+    def __discard_superseded(self):
+        while len(self.queue) > 0 and self.queue[0][2].state != 'WAITING':
+            heapq.heappop(self.queue)
+
+    def acquire(self, priority: int, key=None, shed: bool = True):
+        """
+        Blocks till a token is available for the call.
+        Args:
+            priority: Priority class
+            key: Newer calls with the same key supersede the waiting one
+            shed: False i.e. the call waits for its turn however deep the queue
+        Returns: False if the call was shed or superseded by a newer call with the same key
+        """
+        waiter = _Waiter(priority, key)
+        stats = self.stats[PRIORITY_NAMES[priority]]
+        with self.cond:
+            self.__refill()
+            self.__discard_superseded()
+            if len(self.queue) == 0 and self.tokens >= 1:
+                return self.__grant(waiter)
+            depth = self.shed_queue_depth.get(priority) if shed else None
+            waiting = self.__waiting()
+            if depth is not None and waiting >= depth:
+                stats['shed'] += 1
+                logger.warning(f"TokenBucketLimiter: Shed {PRIORITY_NAMES[priority]} call with queue {waiting}")
+                return False
+            if key is not None:
+                superseded = self.keyed.get((priority, key))
+                if superseded is not None:
+                    superseded.state = 'COALESCED'
+                    stats['coalesced'] += 1
+                self.keyed[(priority, key)] = waiter
+            heapq.heappush(self.queue, (priority, next(self.counter), waiter))
+            self.cond.notify_all()
+            try:
+                while True:
+                    if waiter.state == 'COALESCED':
+                        return False
+                    self.__refill()
+                    self.__discard_superseded()
+                    if self.queue[0][2] is waiter and self.tokens >= 1:
+                        heapq.heappop(self.queue)
+                        waiter.state = 'GRANTED'
+                        return self.__grant(waiter)
+                    self.cond.wait(max((1 - self.tokens) / self.rate, 0.001))
+            finally:
+                if waiter.state == 'WAITING':
+                    waiter.state = 'ABANDONED'
+                if key is not None and self.keyed.get((priority, key)) is waiter:
+                    del self.keyed[(priority, key)]
+                self.cond.notify_all()
+
+    def queue_depth(self):
+        with self.cond:
+            return self.__waiting()
+
+    def metrics(self):
+        with self.cond:
+            result = {}
+            for name, stats in self.stats.items():
+                result[name] = dict(stats)
+                result[name]['avg_wait'] = stats['total_wait'] / stats['granted'] if stats['granted'] > 0 else 0.0
+            result['queue_depth'] = self.__waiting()
+            return result
+
+
+class ThrottledBroker:
+    """
+    Wraps the broker (Shoonya) so that order, modify, close & diagnostic calls go through the account limiter.
+    All other attributes are passed through as is.
+    """
+
+    def __init__(self, broker, limiter: TokenBucketLimiter):
+        self.broker = broker
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self.broker, name)
+        priority = METHOD_PRIORITY.get(name)
+        if priority is None or not callable(attr):
+            return attr
+
+        def throttled_call(*args, **kwargs):
+            key = kwargs.get('order_no') if priority == SL_TRAIL else None
+            if not self.limiter.acquire(priority, key=key, shed=name in SHEDDABLE_METHODS):
+                logger.debug(f"ThrottledBroker: Skipped {name} with {kwargs}")
+                return None
+            return attr(*args, **kwargs)
+
+        return throttled_call
+
+
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(acct: str) -> TokenBucketLimiter:
+    """
+    Per account limiter shared by all the engine paths
+    """
+    with limiters_lock:
+        if acct not in limiters:
+            limiters[acct] = TokenBucketLimiter()
+        return limiters[acct]
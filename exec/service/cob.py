@@ -1,4 +1,7 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import pandas as pd
 from commons.backtest.fastBT import FastBT
@@ -9,10 +12,50 @@ from commons.loggers.setup_logger import setup_logging
 from commons.service.LogService import LogService
 from commons.service.ScripDataService import ScripDataService
 
+from exec.service.archive import TradeArchive, PARAMS_DATASET, TRADES_DATASET, MTM_DATASET, RECON_DATASET
+from exec.service.cob_ledger import StageLedger, fingerprint, DONE
+from exec.service.db import TraderDb, get_database_engine, get_trader_db
+from exec.service.log_writer import AsyncLogService
+from exec.utils.EntriesLoader import to_plain_dtypes
 from exec.utils.ParamBuilder import load_params, store_param_hist
+from exec.utils.Reconcile import reconcile_trades, summarise_recon
 
 logger = logging.getLogger(__name__)
 
+# Backtest worker processes in store_bt_trades; 1 i.e. a single FastBT run over all the params
+BT_WORKERS = int(os.environ.get('COB_BT_WORKERS', 1))
+# In run order; "setup" (broker session & params) is not a ledger stage
+STAGES = ["store_params", "store_broker_trades", "store_bt_trades", "reconcile"]
+
+
+def run_bt_partition(exec_mode: str, params: pd.DataFrame):
+    """
+    FastBT accuracy run over a params partition - process pool worker
+    """
+    return FastBT(exec_mode=exec_mode).run_cob_accuracy(params=params)
+
+
+def run_cob_accuracy(params: pd.DataFrame, exec_mode: str = "SERVER", workers: int = BT_WORKERS):
+    """
+    FastBT.run_cob_accuracy with the params partitioned by scrip across a process pool.
+    The tick data is loaded (by ScripDataService) before the run & shared by the workers.
+    Returns: (bt_trades, stats list i.e. one per partition, bt_mtm dict) as concatenated over the partitions - a
+        serial run is a single partition
+    """
+    partitions = [partition for _, partition in params.groupby('scrip', sort=False)]
+    if workers <= 1 or len(partitions) <= 1:
+        bt_trades, stats, bt_mtm = run_bt_partition(exec_mode, params)
+        return bt_trades, [stats], bt_mtm
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as pool:
+        results = list(pool.map(run_bt_partition, [exec_mode] * len(partitions), partitions))
+    trades = [bt_trades for bt_trades, _, _ in results if len(bt_trades) > 0]
+    bt_trades = pd.concat(trades, ignore_index=True) if len(trades) > 0 else results[0][0]
+    bt_mtm = {}
+    for _, _, partition_mtm in results:
+        bt_mtm.update(partition_mtm)
+    logger.info(f"run_cob_accuracy: {len(partitions)} scrips on {min(workers, len(partitions))} workers")
+    return bt_trades, [stats for _, stats, _ in results], bt_mtm
+
 
 def calc_order_stats(row):
     if row['sl_order_status'] == 'SL-HIT':
@@ -33,18 +76,29 @@ def calc_order_stats(row):
 
 class CloseOfBusiness:
 
-    def __init__(self, trader_db: DatabaseEngine = None):
+    def __init__(self, trader_db: DatabaseEngine = None, db: TraderDb = None, archive: TradeArchive = None,
+                 ledger: StageLedger = None):
         if trader_db is None:
-            self.trader_db = DatabaseEngine()
+            self.trader_db = get_database_engine()
         else:
             self.trader_db = trader_db
-        self.ls = LogService(trader_db)
+        # Pooled & shared; created on first write
+        self.__db = db
+        self.archive = TradeArchive() if archive is None else archive
+        self.ledger = StageLedger() if ledger is None else ledger
+        self.ls = AsyncLogService(LogService(trader_db))
         self.acct = None
         self.shoonya = None
         self.params = None
         self.sds = None
         self.cob_date = None
 
+    @property
+    def db(self) -> TraderDb:
+        if self.__db is None:
+            self.__db = get_trader_db()
+        return self.__db
+
     def setup(self, acct: str, cob_date: str, params: pd.DataFrame = None):
         logger.debug(f"Entered cob setup for {acct} & cob: {cob_date}")
         self.acct = acct
@@ -60,7 +114,10 @@ class CloseOfBusiness:
         self.sds = ScripDataService(shoonya=self.shoonya, trader_db=self.trader_db)
 
     def store_broker_trades(self, acct: str = None, cob_date: str = None, shoonya: Shoonya = None,
-                            ls: LogService = None, params: pd.DataFrame = None):
+                            ls: LogService = None, params: pd.DataFrame = None, orders: list = None):
+        """
+        Returns: True once the broker trades are stored; False if there were no orders to store
+        """
         logger.debug(f"Starting store broker trades for {acct} & cob {cob_date}")
         if acct is None:
             acct = self.acct
@@ -75,14 +132,15 @@ class CloseOfBusiness:
             predicate += f",m.{PARAMS_HIST}.trade_date == '{cob_date}'"
             params = self.trader_db.query_df(PARAMS_HIST, predicate=predicate)
         logger.debug(f"Params:\n{params}")
-        orders = shoonya.api_get_order_book()
+        if orders is None:
+            orders = shoonya.api_get_order_book()
         logger.debug(f"Orders:\n{orders}")
         if orders is None:
             logger.error(f"__store_broker_trades: No Broker orders to store")
-            return
+            return False
         if len(orders) == 0:
             logger.error(f"__store_broker_trades: No Broker orders to store")
-            return
+            return False
         else:
             ls.log_entry(log_type=BROKER_TRADE_LOG_TYPE, keys=["COB"], data=orders, log_date=cob_date, acct=acct)
             logger.info(f"store_broker_trades: Broker Trades created for {acct}")
@@ -115,15 +173,18 @@ class CloseOfBusiness:
             params.fillna(0, inplace=True)
 
             logger.debug(f"About to store trade_log:\n{params}")
-            predicate = f"m.{TRADE_LOG}.acct == '{acct}'"
-            predicate += f",m.{TRADE_LOG}.trade_date == '{cob_date}'"
-            predicate += f",m.{TRADE_LOG}.trade_type == 'BROKER'"
-            self.trader_db.delete_recs(TRADE_LOG, predicate=predicate)
-            self.trader_db.bulk_insert(TRADE_LOG, data=params)
+            with self.db.unit_of_work() as uow:
+                uow.replace_recs(TRADE_LOG, data=params, acct=acct, trade_date=cob_date, trade_type='BROKER')
+            self.archive.safe_write(TRADES_DATASET, params, trade_date=cob_date, acct=acct, trade_type='BROKER')
             logger.info("store_broker_trades: Done")
+            return True
 
     def store_bt_trades(self, acct: str = None, cob_date: str = None, params: pd.DataFrame = None,
-                        exec_mode: str = "SERVER", sds: ScripDataService = None, ls: LogService = None):
+                        exec_mode: str = "SERVER", sds: ScripDataService = None, ls: LogService = None,
+                        workers: int = BT_WORKERS):
+        """
+        Returns: True once the backtest results are stored; False if there were no params
+        """
         logger.debug(f"Starting store bt trades for {acct} & cob {cob_date}")
         if acct is None:
             acct = self.acct
@@ -137,17 +198,23 @@ class CloseOfBusiness:
             params = self.trader_db.query_df(PARAMS_HIST, predicate=predicate)
         if len(params) == 0:
             logger.error(f"Unable to find params for {acct} for {cob_date}")
-            return
+            return False
         logger.debug(f"Params:\n{params}")
         scrips = list(set(params.scrip))
 
         sds.load_scrips_data(scrip_names=scrips, opts=["TICK"])
         logger.debug(f"Tick Data loaded for {scrips}")
 
-        f = FastBT(exec_mode=exec_mode)
-        bt_trades, _, bt_mtm = f.run_cob_accuracy(params=params)
+        params = to_plain_dtypes(params)
+        bt_trades, _, bt_mtm = run_cob_accuracy(params=params, exec_mode=exec_mode, workers=workers)
         params.rename(columns={"model": "strategy"}, inplace=True)
         logger.debug(f"run_cob_accuracy: Completed with BT trades: {len(bt_trades)} & {len(bt_mtm)} entries")
+        # Trade log & MTM for the acct / day are re-written as one unit
+        with self.db.unit_of_work() as uow:
+            self.__store_bt_results(uow, acct, cob_date, params, bt_trades, bt_mtm, ls)
+        return True
+
+    def __store_bt_results(self, uow, acct, cob_date, params, bt_trades, bt_mtm, ls):
         if len(bt_trades) > 0:
             if ls is None:
                 ls = self.ls
@@ -166,26 +233,24 @@ class CloseOfBusiness:
 
             logger.debug(f"About to store trade_log:\n{bt_trades}")
             ls.log_entry(log_type=BT_TRADE_LOG_TYPE, keys=["COB"], data=bt_trades, log_date=cob_date, acct=acct)
-            predicate = f"m.{TRADE_LOG}.acct == '{acct}'"
-            predicate += f",m.{TRADE_LOG}.trade_date == '{cob_date}'"
-            predicate += f",m.{TRADE_LOG}.trade_type == 'BACKTEST'"
-            self.trader_db.delete_recs(TRADE_LOG, predicate=predicate)
-            self.trader_db.bulk_insert(TRADE_LOG, data=bt_trades)
+            uow.replace_recs(TRADE_LOG, data=bt_trades, acct=acct, trade_date=cob_date, trade_type='BACKTEST')
+            self.archive.safe_write(TRADES_DATASET, bt_trades, trade_date=cob_date, acct=acct, trade_type='BACKTEST')
 
         if len(bt_mtm) > 0:
-            predicate = f"m.{TRADES_MTM_TABLE}.acct == '{acct}'"
-            predicate += f",m.{TRADES_MTM_TABLE}.trade_date == '{cob_date}'"
-            self.trader_db.delete_recs(TRADES_MTM_TABLE, predicate=predicate)
-            for key, bt_mtm_entries in bt_mtm.items():
-                bt_mtm_entries = bt_mtm_entries.merge(params[['scrip', 'strategy', 'quantity']], how='left',
-                                                      left_on=['scrip', 'strategy'], right_on=['scrip', 'strategy'])
-                bt_mtm_entries['mtm'] = bt_mtm_entries.mtm * bt_mtm_entries.quantity
-                bt_mtm_entries['time'] = bt_mtm_entries['time'].astype(int)
-                bt_mtm_entries['datetime'] = bt_mtm_entries['datetime'].astype(str)
-                bt_mtm_entries.fillna(0, inplace=True)
-                bt_mtm_entries = bt_mtm_entries.assign(acct=acct)
-                logger.debug(f"About to store trade_log for {key}:\n{bt_mtm_entries}")
-                self.trader_db.bulk_insert(TRADES_MTM_TABLE, data=bt_mtm_entries)
+            uow.delete_recs(TRADES_MTM_TABLE, acct=acct, trade_date=cob_date)
+            # All the scrip / model MTM frames in one go
+            bt_mtm_entries = pd.concat(bt_mtm.values(), ignore_index=True)
+            bt_mtm_entries = bt_mtm_entries.merge(params[['scrip', 'strategy', 'quantity']], how='left',
+                                                  left_on=['scrip', 'strategy'], right_on=['scrip', 'strategy'])
+            bt_mtm_entries['mtm'] = bt_mtm_entries.mtm * bt_mtm_entries.quantity
+            bt_mtm_entries['time'] = bt_mtm_entries['time'].astype(int)
+            bt_mtm_entries['datetime'] = bt_mtm_entries['datetime'].astype(str)
+            bt_mtm_entries.fillna(0, inplace=True)
+            bt_mtm_entries = bt_mtm_entries.assign(acct=acct)
+            logger.debug(f"About to store trade_log for {list(bt_mtm.keys())}:\n{bt_mtm_entries}")
+            uow.bulk_insert(TRADES_MTM_TABLE, data=bt_mtm_entries)
+            self.archive.safe_write(MTM_DATASET, bt_mtm_entries, trade_date=cob_date, acct=acct,
+                                    trade_type='BACKTEST')
         else:
             logger.error(f"No records in BT Trades for {self.acct}")
             self.ls.log_entry(log_type=BT_TRADE_LOG_TYPE, keys=["COB"], data=pd.DataFrame(), log_date=self.cob_date,
@@ -198,7 +263,7 @@ class CloseOfBusiness:
         :param acct:
         :param cob_date:
         :param params:
-        :return:
+        :return: True once stored; False if there were no params
         """
         logger.debug(f"Entered store params for {acct} & cob: {cob_date}")
         if acct is None:
@@ -212,47 +277,152 @@ class CloseOfBusiness:
 
         if len(params) > 0:
             self.ls.log_entry(log_type=PARAMS_LOG_TYPE, keys=["COB"], data=params, log_date=cob_date, acct=acct)
-            store_param_hist(trader_db=self.trader_db, acct=acct, cob_date=cob_date, params=params)
+            store_param_hist(trader_db=self.db, acct=acct, cob_date=cob_date, params=params)
+            self.archive.safe_write(PARAMS_DATASET, params, trade_date=cob_date, acct=acct)
+            return True
+        logger.error(f"store_params: No Params found to store")
+        return False
+
+    def reconcile(self, acct: str = None, cob_date: str = None, trades: pd.DataFrame = None):
+        """
+        Broker vs backtest reconciliation (slippage, fill latency, PnL gap & missed trades) of the stored trades
+        :param acct:
+        :param cob_date:
+        :param trades: TRADE_LOG rows of the acct & day; read from the DB if not provided
+        :return: Recon frame
+        """
+        logger.debug(f"Starting reconcile for {acct} & cob {cob_date}")
+        if acct is None:
+            acct = self.acct
+        if cob_date is None:
+            cob_date = self.cob_date
+        if trades is None:
+            predicate = f"m.{TRADE_LOG}.acct == '{acct}'"
+            predicate += f",m.{TRADE_LOG}.trade_date == '{cob_date}'"
+            trades = self.trader_db.query_df(TRADE_LOG, predicate=predicate)
+        if len(trades) == 0:
+            logger.error(f"reconcile: No trades found for {acct} for {cob_date}")
+            return None
+        recon = reconcile_trades(broker_trades=trades.loc[trades.trade_type == 'BROKER'],
+                                 bt_trades=trades.loc[trades.trade_type == 'BACKTEST'])
+        # The archive is the only store of the recon i.e. a failure fails the stage
+        self.archive.write(RECON_DATASET, recon, trade_date=cob_date, acct=acct)
+        logger.info(f"reconcile: {acct} {cob_date} Summary: {summarise_recon(recon)}")
+        return recon
+
+    def __query_day(self, table: str, acct: str, cob_date: str):
+        predicate = f"m.{table}.acct == '{acct}'"
+        predicate += f",m.{table}.trade_date == '{cob_date}'"
+        return self.trader_db.query_df(table, predicate=predicate)
+
+    def __all_done(self, acct: str, cob_date: str, stages: list[str]):
+        for stage in stages:
+            entry = self.ledger.get(acct, cob_date, stage)
+            if entry is None or entry['status'] != DONE:
+                return False
+        return True
+
+    def __run_stage(self, stage: str, acct: str, cob_date: str, params: pd.DataFrame, force: bool = False,
+                    setup=None):
+        """
+        Runs the stage unless it is done for the same inputs - each stage's own inputs are fetched (& passed on to
+        the stage) to fingerprint them
+        :param setup: Deferred setup i.e. no broker session yet; run before the backtest if it has to run. The stages
+            whose inputs need the session (order book, loaded params) are taken as done
+        Returns: True if the stage is complete
+        """
+        if setup is not None and (stage == "store_broker_trades" or (stage == "store_params" and params is None)):
+            logger.info(f"Skipping {stage} for {acct} - done & no broker session")
+            return True
+        if stage == "store_params":
+            params = self.params if params is None else params
+            input_fp = None if params is None else fingerprint(acct, cob_date, params)
+            run = partial(self.store_params, acct=acct, cob_date=cob_date, params=params)
+        elif stage == "store_broker_trades":
+            params_hist = self.__query_day(PARAMS_HIST, acct, cob_date)
+            orders = self.shoonya.api_get_order_book()
+            input_fp = None if orders is None else fingerprint(acct, cob_date, params_hist, orders)
+            run = partial(self.store_broker_trades, acct=acct, cob_date=cob_date, params=params_hist, orders=orders)
+        elif stage == "store_bt_trades":
+            if params is None:
+                params = self.__query_day(PARAMS_HIST, acct, cob_date)
+            # The ticks are loaded by the run only i.e. fingerprinted by their source (scrips & day)
+            input_fp = fingerprint(acct, cob_date, params, sorted(set(params.scrip)), "TICK") \
+                if len(params) > 0 else None
+            run = partial(self.store_bt_trades, acct=acct, cob_date=cob_date, params=params)
+        elif stage == "reconcile":
+            trades = self.__query_day(TRADE_LOG, acct, cob_date)
+            input_fp = fingerprint(acct, cob_date, trades)
+            run = partial(self.reconcile, acct=acct, cob_date=cob_date, trades=trades)
+        else:
+            raise ValueError(f"Unknown COB stage {stage}")
+
+        if not force and self.ledger.is_done(acct, cob_date, stage, input_fp):
+            logger.info(f"Skipping {stage} for {acct} - done for the same inputs")
+            return True
+        if setup is not None and stage == "store_bt_trades":
+            logger.info(f"Starting deferred setup for {acct}")
+            setup()
+        logger.info(f"Starting {stage} for {acct}")
+        try:
+            result = run()
+        except Exception as ex:
+            self.ledger.mark_failed(acct, cob_date, stage, input_fp, repr(ex))
+            raise
+        # reconcile returns the recon frame
+        completed = result is True or (stage == "reconcile" and result is not None)
+        if completed:
+            self.ledger.mark_done(acct, cob_date, stage, input_fp)
         else:
-            logger.error(f"store_params: No Params found to store")
+            self.ledger.mark_incomplete(acct, cob_date, stage, input_fp)
+        return completed
 
-    def run_cob(self, accounts: str, cob_date: str = None, opts: list[str] = None, params_dict: dict = None):
+    def run_cob(self, accounts: str, cob_date: str = None, opts: list[str] = None, params_dict: dict = None,
+                force: bool = False):
         """
         This provides post process functions i.e. After all open orders are closed
         For every account in the accounts list:
             1. self.store_params() - Form the params data & store to DB
             2. self.store_broker_trades() - Store Trades to DB
             3. self.store_bt_trades() - Store Backtesting results to DB
+            4. self.reconcile() - Broker vs Backtest trades recon
+        Every stage's own inputs (params, order book, params hist & tick scrips, trade log) are fingerprinted & its
+        completion recorded in the stage ledger. A re-run skips the stages done for the same inputs i.e. resumes from
+        the failed / incomplete (e.g. no orders yet) ones or those whose inputs changed; force re-runs all the stages.
+        The ticks are fingerprinted by their source (scrips & day) i.e. not loaded to decide on a skip. Setup (broker
+        session, params & tick service) is deferred if all the stages are done - run only if the backtest has to.
         """
         logger.info(f"Start COB for {accounts} for {cob_date} with opts: {opts}")
         if opts is None:
-            opts = ["setup", "store_params", "store_broker_trades", "store_bt_trades"]
+            opts = ["setup"] + STAGES
 
         if cob_date is None:
             cob_date = S_TODAY
 
-        for acct in accounts.split(","):
-            account = acct.strip()
-            if params_dict is not None:
-                params = params_dict.get(account, None)
-            else:
-                params = None
-            if "setup" in opts:
-                logger.info(f"Starting setup for {account}")
-                self.setup(acct=account, cob_date=cob_date, params=params)
-            if "store_params" in opts:
-                logger.info(f"Starting store_params for {account}")
-                self.store_params(acct=account, cob_date=cob_date, params=params)
-            if "store_broker_trades" in opts:
-                logger.info(f"Starting store_broker_trades for {account}")
-                self.store_broker_trades(acct=account, cob_date=cob_date)
-            if "store_bt_trades" in opts:
-                logger.info(f"Starting store_bt_trades for {account}")
-                self.store_bt_trades(acct=account, cob_date=cob_date, params=params)
+        # Log entries are written in the background while the next stage / account proceeds
+        self.ls.start()
+        try:
+            for acct in accounts.split(","):
+                account = acct.strip()
+                if params_dict is not None:
+                    params = params_dict.get(account, None)
+                else:
+                    params = None
+                stages = [stage for stage in STAGES if stage in opts]
+                setup = None
+                if "setup" in opts:
+                    setup = partial(self.setup, acct=account, cob_date=cob_date, params=params)
+                if setup is not None and (force or not self.__all_done(account, cob_date, stages)):
+                    logger.info(f"Starting setup for {account}")
+                    setup()
+                    setup = None
+                for stage in stages:
+                    self.__run_stage(stage, account, cob_date, params, force=force, setup=setup)
+        finally:
+            self.ls.stop()
 
         logger.info("Completed COB Processing")
 
-
 if __name__ == '__main__':
     setup_logging("cob.log")
     c = CloseOfBusiness()
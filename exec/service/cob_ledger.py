@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+from commons.config.reader import cfg
+
+logger = logging.getLogger(__name__)
+
+DONE = 'DONE'
+# Ran without error but had nothing to work on e.g. no broker orders yet
+INCOMPLETE = 'INCOMPLETE'
+FAILED = 'FAILED'
+LEDGER_PATH_ENV = 'COB_LEDGER_PATH'
+
+
+def get_ledger_path():
+    path = os.environ.get(LEDGER_PATH_ENV)
+    if path is None:
+        path = os.path.join(cfg['generated'], 'cob-ledger.json')
+    return path
+
+
+def fingerprint(*parts):
+    """
+    Content hash of the stage inputs - DataFrames are hashed by value (index & columns included), others by str
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(",".join(map(str, part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif part is not None:
+            digest.update(str(part).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class StageLedger:
+    """
+    Completions of the COB stages keyed by (acct, cob_date, stage) along with the fingerprint of the stage inputs.
+    A stage is skipped on a re-run only if it is DONE for the same fingerprint; FAILED & INCOMPLETE stages are re-run.
+    The ledger is a JSON file re-written atomically on every update.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.__entries = None
+
+    @property
+    def root(self):
+        if self.path is None:
+            self.path = get_ledger_path()
+        return self.path
+
+    @staticmethod
+    def key(acct: str, cob_date: str, stage: str):
+        return f"{acct}|{cob_date}|{stage}"
+
+    def __load(self):
+        if self.__entries is None:
+            self.__entries = {}
+            if os.path.exists(self.root):
+                try:
+                    with open(self.root, 'r') as f:
+                        self.__entries = json.load(f)
+                except (OSError, ValueError) as ex:
+                    logger.warning(f"StageLedger: Ignoring unreadable ledger {self.root}: {ex}")
+        return self.__entries
+
+    def __save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.root)), exist_ok=True)
+        tmp_path = f"{self.root}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.__entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.root)
+
+    def get(self, acct: str, cob_date: str, stage: str):
+        with self.lock:
+            return self.__load().get(self.key(acct, cob_date, stage))
+
+    def is_done(self, acct: str, cob_date: str, stage: str, input_fp: str):
+        if input_fp is None:
+            return False
+        entry = self.get(acct, cob_date, stage)
+        return entry is not None and entry['status'] == DONE and entry['fingerprint'] == input_fp
+
+    def __record(self, acct: str, cob_date: str, stage: str, input_fp: str, status: str, error: str = None):
+        with self.lock:
+            entries = self.__load()
+            entries[self.key(acct, cob_date, stage)] = {'fingerprint': input_fp, 'status': status, 'error': error,
+                                                        'ts': int(time.time())}
+            try:
+                self.__save()
+            except OSError as ex:
+                # Only costs a re-run of the stage
+                logger.warning(f"StageLedger: Unable to write ledger {self.root}: {ex}")
+
+    def mark_done(self, acct: str, cob_date: str, stage: str, input_fp: str):
+        self.__record(acct, cob_date, stage, input_fp, DONE)
+
+    def mark_incomplete(self, acct: str, cob_date: str, stage: str, input_fp: str):
+        self.__record(acct, cob_date, stage, input_fp, INCOMPLETE)
+
+    def mark_failed(self, acct: str, cob_date: str, stage: str, input_fp: str, error: str):
+        self.__record(acct, cob_date, stage, input_fp, FAILED, error)
@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+from commons.config.reader import cfg
+from commons.dataprovider.database import DatabaseEngine
+from sqlalchemy import MetaData, Table, and_, create_engine
+from sqlalchemy.engine import URL, Connection
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_RECYCLE = 1800
+
+# e.g. sqlite:///trader.db for local runs; defaults to the postgres config
+DB_URL_ENV = 'TRADER_DB_URL'
+
+
+def get_db_url():
+    url = os.environ.get(DB_URL_ENV)
+    if url is not None:
+        return url
+    conf = cfg['postgres']
+    return URL.create("postgresql+psycopg2", username=conf['username'], password=conf['password'],
+                      host=conf['host'], port=conf['port'], database=conf['database'])
+
+
+def _normalise(name: str):
+    return name.replace('_', '').lower()
+
+
+class UnitOfWork:
+    """
+    All the statements within a unit of work share a connection & are committed (or rolled back) together
+    """
+
+    def __init__(self, db: 'TraderDb', conn: Connection):
+        self.db = db
+        self.conn = conn
+
+    def __where(self, table: Table, filters: dict):
+        return and_(*(table.c[col] == val for col, val in filters.items()))
+
+    def query_df(self, table_name: str, **filters):
+        table = self.db.table(table_name)
+        return pd.read_sql(table.select().where(self.__where(table, filters)), self.conn)
+
+    def delete_recs(self, table_name: str, **filters):
+        table = self.db.table(table_name)
+        return self.conn.execute(table.delete().where(self.__where(table, filters))).rowcount
+
+    def bulk_insert(self, table_name: str, data: pd.DataFrame):
+        if len(data) == 0:
+            return 0
+        table = self.db.table(table_name)
+        cols = [col for col in data.columns if col in table.c]
+        self.conn.execute(table.insert(), data[cols].to_dict(orient='records'))
+        return len(data)
+
+    def replace_recs(self, table_name: str, data: pd.DataFrame, **filters):
+        """
+        Delete the records matching the filters & insert the data i.e. an atomic re-write of e.g. an acct's day
+        """
+        deleted = self.delete_recs(table_name, **filters)
+        inserted = self.bulk_insert(table_name, data)
+        logger.debug(f"UnitOfWork: {table_name} {filters} Deleted: {deleted}, Inserted: {inserted}")
+        return inserted
+
+
+class TraderDb:
+    """
+    Pooled connections to the trader DB (PostgreSQL; SQLite for local runs) shared by the engine, COB &
+    their workers. Writes go through unit_of_work i.e. one transaction per logical change.
+    """
+
+    def __init__(self, url=None, pool_size: int = POOL_SIZE, max_overflow: int = MAX_OVERFLOW):
+        if url is None:
+            url = get_db_url()
+        if str(url).startswith('sqlite'):
+            # Pool connections are handed across threads - SQLite serialises writers itself
+            self.engine = create_engine(url, connect_args={'check_same_thread': False}, pool_pre_ping=True)
+        else:
+            self.engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                                        pool_recycle=POOL_RECYCLE, pool_pre_ping=True)
+        self.metadata = MetaData()
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> Table:
+        """
+        Reflected table by name - matched ignoring case & underscores i.e. ParamsHist ~ params_hist
+        """
+        key = _normalise(name)
+        table = self.tables.get(key)
+        if table is None:
+            with self.lock:
+                if key not in self.tables:
+                    self.metadata.reflect(bind=self.engine)
+                    for table_name, reflected in self.metadata.tables.items():
+                        self.tables[_normalise(table_name)] = reflected
+                table = self.tables.get(key)
+            if table is None:
+                raise ValueError(f"Unknown table {name}")
+        return table
+
+    @contextmanager
+    def unit_of_work(self):
+        with self.engine.begin() as conn:
+            yield UnitOfWork(self, conn)
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+_lock = threading.Lock()
+_trader_db = None
+_database_engine = None
+
+
+def get_trader_db() -> TraderDb:
+    """
+    Process wide pooled TraderDb
+    """
+    global _trader_db
+    with _lock:
+        if _trader_db is None:
+            _trader_db = TraderDb()
+        return _trader_db
+
+
+def get_database_engine() -> DatabaseEngine:
+    """
+    Process wide DatabaseEngine (for LogService & queries) instead of one per component
+    """
+    global _database_engine
+    with _lock:
+        if _database_engine is None:
+            _database_engine = DatabaseEngine()
+        return _database_engine
@@ -1,23 +1,46 @@
+import atexit
 import datetime
 import os
 import sys
+import threading
 import time
 
 import pandas as pd
 from commons.broker.Shoonya import Shoonya
 from commons.consts.consts import IST, S_TODAY, PARAMS_LOG_TYPE
-from commons.dataprovider.database import DatabaseEngine
 from commons.service.LogService import LogService
 from commons.service.RiskCalc import RiskCalc
-from commons.utils.EmailAlert import send_email
 from commons.utils.Misc import get_epoch, get_new_sl
 
+from exec.service.alerts import AlertDispatcher
+from exec.service.broker import ThrottledBroker, get_limiter
+from exec.service.db import get_database_engine, get_trader_db
+from exec.service.kill_switch import KillSwitch, get_kill_switch_limits
+from exec.service.log_writer import AsyncLogService
+from exec.service.mtm import LiveMtm
+from exec.service.order_updates import OrderUpdatePipeline
+from exec.service.paper_broker import PaperBroker
+from exec.service.quote_conflator import QuoteConflator, RECV_TS
+from exec.service.shm_state import ShmStateWriter
+from exec.service.sl_tracker import SlModifyTracker
+from exec.service.status import StatusPublisher, LatencyHistogram, build_status
+from exec.service.subscriptions import SubscriptionManager
+from exec.service.square_off import SquareOffExecutor
 from exec.utils.EngineUtils import *
-from exec.utils.ParamBuilder import load_params, store_param_hist
+from exec.utils.ParamBuilder import load_params, store_param_hist, build_order_template, build_order_templates
+from exec.utils.ParamsSchema import set_values
 
-MOCK = False
+# Paper trading i.e. orders are simulated on the live quotes (PaperBroker) instead of being sent to the broker
+MOCK = os.environ.get('ENGINE_MOCK', 'N') == 'Y'
+# Paper trading state is persisted (LogService, status & shm) under <acct>-PAPER, never the live account
+PAPER_SUFFIX = '-PAPER'
 RECONNECT_COUNTER = 0
 
+# Local status endpoint (http://127.0.0.1:<port>/status); 0 i.e. disabled
+STATUS_PORT = int(os.environ.get('ENGINE_STATUS_PORT', 0))
+# Shared memory state export for the cross account monitor (exec.service.shm_state)
+SHM_EXPORT = os.environ.get('ENGINE_SHM_EXPORT', 'N') == 'Y'
+
 MKT_PRICE_TYPE = 'MKT'
 SL_PRICE_TYPE = "SL-MKT"
 
@@ -30,72 +53,103 @@ pd.options.mode.chained_assignment = None
 socket_opened = False
 params = pd.DataFrame()
 acct = os.environ.get('ACCOUNT')
-api = Shoonya(acct)
-trader_db = DatabaseEngine()
+# Account the engine state is persisted & published under
+state_acct = acct
+api = ThrottledBroker(Shoonya(acct), get_limiter(acct))
+trader_db = get_database_engine()
 instruments = []
-ls = LogService(trader_db=trader_db)
+order_templates = {}
+order_index = OrderIndex()
+params_lock = threading.RLock()
+subscriptions = SubscriptionManager(api=api)
+alerts = AlertDispatcher()
+mtm = LiveMtm(acct=acct)
+kill_switch = KillSwitch(acct=acct, limits=get_kill_switch_limits(acct))
+mtm.add_listener(kill_switch.on_mtm)
+ls = AsyncLogService(LogService(trader_db=trader_db))
+status = StatusPublisher(port=STATUS_PORT)
+# Quote receipt to entry order placed & order update receipt to applied
+tick_to_order = LatencyHistogram()
+order_update_latency = LatencyHistogram()
+shm_state = ShmStateWriter()
 rc = RiskCalc(mode="PRESET")
+order_updates = None
+quotes = None
 
 
-def __get_signal_strength(df: pd.DataFrame, ltp: float):
-    global params
+def __params_snapshot():
+    """
+    Consistent copy of the complete params
+    """
+    with params_lock:
+        return params.copy()
+
+
+def __get_signal_strength(frame: pd.DataFrame, df: pd.DataFrame, ltp: float):
     df['strength'] = df['signal'] * (df['target'] - ltp)
     for idx, row in df.iterrows():
-        params.loc[idx, 'strength'] = row['strength']
-        params.loc[idx, 'active'] = 'N' if row['strength'] <= 0 else 'Y'
-    logger.debug(f"Params with strength:\n{params}")
+        frame.loc[idx, 'strength'] = row['strength']
+        frame.loc[idx, 'active'] = 'N' if row['strength'] <= 0 else 'Y'
+    logger.debug(f"Params with strength:\n{frame}")
     return df
 
 
-def __create_bracket_order(idx, row, ltp):
-    global params
-    logger.debug(f"__create_bracket_order: Creating bracket order for {row.model}, {row.scrip}, {str(idx)}")
-    params.loc[idx, 'entry_order_id'] = -1
-    direction = 'B' if row.signal == 1 else 'S'
-    remarks = ":".join(["BO", row.model, row.scrip, str(idx)])
-    target_range, sl_range, trail_sl = rc.calc_risk_params(scrip=row.scrip, strategy=row.model, signal=row.signal,
-                                                           tick=row.tick, acct=acct, entry=ltp,
-                                                           prev_close=row.close, pred_target=row.target)
-    resp = api.api_place_order(buy_or_sell=direction,
+def __create_bracket_order(frame: pd.DataFrame, idx, row, ltp):
+    template = order_templates.get(idx)
+    if template is None:
+        template = build_order_template(idx, row, acct, rc)
+    logger.debug(f"__create_bracket_order: Creating bracket order for {template.remarks}")
+    frame.loc[idx, 'entry_order_id'] = -1
+    target_range, sl_range, trail_sl = template.risk_params(entry=ltp)
+    resp = api.api_place_order(buy_or_sell=template.direction,
                                product_type='B',
-                               exchange=row.exchange,
-                               trading_symbol=row.symbol,
-                               quantity=row.quantity,
+                               exchange=template.exchange,
+                               trading_symbol=template.symbol,
+                               quantity=template.quantity,
                                disclose_qty=0,
                                price_type=MKT_PRICE_TYPE,
                                price=0.00,
                                trigger_price=None,
                                retention='DAY',
-                               remarks=remarks,
+                               remarks=template.remarks,
                                book_loss_price=sl_range,
                                book_profit_price=target_range
                                )
-    params.loc[idx, 'target_range'] = float(target_range)
-    params.loc[idx, 'sl_range'] = float(sl_range)
-    params.loc[idx, 'trail_sl'] = float(trail_sl)
-    params.loc[idx, 'bod_sl'] = ltp - row.signal * float(sl_range)
+    frame.loc[idx, 'target_range'] = float(target_range)
+    frame.loc[idx, 'sl_range'] = float(sl_range)
+    frame.loc[idx, 'trail_sl'] = float(trail_sl)
+    frame.loc[idx, 'bod_sl'] = ltp - template.signal * float(sl_range)
     logger.debug(f"__create_bracket_order: BO Leg Resp: {resp}")
     if resp is None:
         logger.error("__create_bracket_order: Error in creating entry leg")
-        return
-    logger.debug(f"__create_bracket_order: Post Target: Params\n{params}")
+        return resp
+    logger.debug(f"__create_bracket_order: Post Target: Params\n{frame}")
+    return resp
 
 
 def __close_all_trades():
     global instruments
     global params
     global api
-    api.api_unsubscribe(instruments)
-    open_params = params.loc[params.active == 'Y']
+    subscriptions.unsubscribe_all()
+    current_params = __params_snapshot()
+    open_params = current_params.loc[current_params.active == 'Y']
     # Remove non-executed entries
     open_params.dropna(subset=['entry_ts'], inplace=True)
     logger.info(f"__close_all_trades: Will now close open trades:\n{open_params}")
-    for idx, order in open_params.iterrows():
-        logger.debug(f"__close_all_trades: About to close\n{order}")
-        # Exiting all Bracket orders by making them MKT orders.
-        resp = api.api_close_bracket_order(order_no=order['entry_order_id'])
-        logger.debug(f"__close_all_trades: Closed BO: {order['entry_order_id']}, Resp: {resp}")
-    logger.info(f"__close_all_trades: Post Close params:\n{params}")
+    # Exiting all Bracket orders by making them MKT orders - largest notional first.
+    notional = (open_params['quantity'] * open_params['entry_price'].astype(float)).abs().fillna(0)
+    orders = list(zip(open_params.index, open_params['entry_order_id'].astype(str), notional))
+    square_off.close_all(orders)
+    logger.info(f"__close_all_trades: Post Close params:\n{__params_snapshot()}")
+
+
+def __escalate_square_off(open_orders):
+    alerts.alert(subject=f"Square off failed! - {state_acct}", body=f"Unable to confirm close for {open_orders}",
+                 acct=acct)
+
+
+square_off = SquareOffExecutor(api=api, on_escalate=__escalate_square_off)
 
 
 def event_handler_open_callback():
@@ -104,123 +158,198 @@ def event_handler_open_callback():
     global api
     global instruments
     socket_opened = True
-    instruments = list(set(params.apply(lambda row: f"{row['exchange']}|{row['token']}", axis=1)))
+    # Only tokens which can still act - also on reconnect
+    instruments = subscriptions.subscribe(__params_snapshot())
     logger.info(f"Subscribed instruments: {instruments}")
-    api.api_subscribe(instruments)
     api.api_subscribe_orders()
 
 
-def event_handler_quote_update(data):
-    global api
-    global acct
-    global params
-    logger.debug(f"Quote_Update: Entered Quote Callback with {data}")
+def process_quote(frame: pd.DataFrame, data):
+    """
+    Entry & SL trail processing of a quote against the given params frame
+    """
     ltp = data.get('lp', None)
     if ltp is not None:
         ltp = float(ltp)
+        mtm.on_tick(data.get('tk'), ltp)
+        status.mark_changed()
         # Entry Leg
-        entries = params.loc[(params['token'] == data.get('tk', -1)) & (pd.isnull(params.entry_order_id)) &
-                             (params['active'] == 'Y')]
+        entries = frame.loc[(frame['token'] == data.get('tk', -1)) & (pd.isnull(frame.entry_order_id)) &
+                            (frame['active'] == 'Y')]
         logger.debug(f"Entry_Leg: Entries:\n{entries}")
         if len(entries) > 0:
-            for idx, row in __get_signal_strength(entries, ltp).iterrows():
+            for idx, row in __get_signal_strength(frame, entries, ltp).iterrows():
                 if row['strength'] > 0:
-                    __create_bracket_order(idx, row, ltp)
+                    if not kill_switch.allow_entry(idx, notional=row['quantity'] * ltp):
+                        continue
+                    resp = __create_bracket_order(frame, idx, row, ltp)
+                    if RECV_TS in data:
+                        tick_to_order.record(time.monotonic() - data[RECV_TS])
+                    kill_switch.on_order(idx, placed=resp is not None)
                 else:
                     # Invalid Signal for the day
-                    params.loc[idx, 'active'] = 'N'
-                    params.loc[idx, 'entry_order_status'] = 'INVALID'
-            logger.info(f"Entry_Leg: Post Update Params:\n{params}")
+                    frame.loc[idx, 'active'] = 'N'
+                    frame.loc[idx, 'entry_order_status'] = 'INVALID'
+            logger.info(f"Entry_Leg: Post Update Params:\n{frame}")
+            subscriptions.update(frame, data.get('tk'))
 
         # SL Update
-        sl_entries = params.loc[(params['token'] == data.get('tk', -1)) & (pd.notnull(params.sl_order_id)) &
-                                (params['active'] == 'Y')]
+        sl_entries = frame.loc[(frame['token'] == data.get('tk', -1)) & (pd.notnull(frame.sl_order_id)) &
+                               (frame['active'] == 'Y')]
         logger.debug(f"SL_Update: SL Entries:\n{sl_entries}")
         if len(sl_entries) > 0:
             for index, order in sl_entries.iterrows():
                 logger.debug(f"SL_Update: About to update order\n{order}")
                 new_sl = get_new_sl(dict(order), float(ltp))
                 if float(new_sl) > 0.0:
+                    sl_order_id = str(order.sl_order_id)
                     resp = api.api_modify_order(exchange=order.exchange,
                                                 trading_symbol=order.symbol,
-                                                order_no=order.sl_order_id,
+                                                order_no=sl_order_id,
                                                 new_quantity=order.quantity,
                                                 new_price_type=SL_PRICE_TYPE,
                                                 new_trigger_price=new_sl
                                                 )
                     logger.debug(f"SL_Update: Modify order Resp: {resp}")
-                    logger.info(f"SL_Update: Post SL Update for {order}\nParams:\n{params}")
+                    if resp is not None:
+                        sl_tracker.request(sl_order_id, index, new_sl)
+                    logger.info(f"SL_Update: Post SL Update for {order}\nParams:\n{frame}")
 
 
-def event_handler_order_update(curr_order):
+def event_handler_quote_update(data):
+    global params
+    logger.debug(f"Quote_Update: Entered Quote Callback with {data}")
+    with params_lock:
+        process_quote(params, data)
+
+
+def process_order_update(frame: pd.DataFrame, curr_order):
     """
     1. Get Order type
     2. Get Order Status i.e. Open (Entry --> N/A, SL --> Trigger Pending, Target --> Open) or Closed (i.e. Completed)
     3. Update Stats to Params
     4. If Closed (i.e. REJECTED, SL-HIT, TARGET-HIT) - Mark Params as inactive (N)
     ** Handling SL Update issues courtesy Shoonya **
-    5. If Order Type = SL - Get Order Hist
+    5. If Order Type = SL - Check the modify against the requested trigger (Order Hist only if ambiguous)
     6. If Order has Rejection - Mark Params as SL-Limit-Hit (S)
     :param curr_order:
     :return:
-        global params Updated as above
+        frame (params) Updated as above
     """
-    global api
-    global params
     logger.debug(f"order_update: Entered Order update Callback with {curr_order}")
     curr_order_id = curr_order['norenordno']
+    status.mark_changed()
     upd_order = api.get_order_status_order_update(curr_order)
-    order_idx = int(upd_order.get('tp_order_num', -1))
-    order_type = upd_order.get('tp_order_type', 'X')
+    indexed_order = order_index.get(curr_order_id)
+    if indexed_order is not None:
+        order_idx, order_type = indexed_order
+    else:
+        order_idx = int(upd_order.get('tp_order_num', -1))
+        order_type = upd_order.get('tp_order_type', 'X')
+        if order_idx != -1 and order_type in LEG_ORDER_ID_COLS:
+            order_index.add(curr_order_id, order_idx, order_type)
     curr_order_status = upd_order.get('tp_order_status', 'NA')
     curr_order_ts = get_epoch(curr_order.get('exch_tm', '0'))
     if order_idx != -1:
-        if order_type == 'ENTRY_LEG':
+        if order_type == ENTRY_LEG:
             price = float(curr_order.get("avgprc", curr_order.get("prc")))
-            params.loc[order_idx, ['entry_order_id', 'entry_order_status', 'entry_ts', 'entry_price']] = (
-                curr_order_id, curr_order_status, curr_order_ts, price)
-            logger.debug(f"order_update: Updated Entry Params:\n{params}")
-
-            if curr_order_status == 'REJECTED':
-                params.loc[order_idx, 'active'] = 'N'
-                logger.debug(f"order_update: Updated Entry Rejection Status Params:\n{params}")
-
-        elif order_type == 'TARGET_LEG':
+            set_values(frame, order_idx, ['entry_order_id', 'entry_order_status', 'entry_ts', 'entry_price'],
+                       (curr_order_id, curr_order_status, curr_order_ts, price))
+            logger.debug(f"order_update: Updated Entry Params:\n{frame}")
+
+            if curr_order_status == 'ENTERED':
+                mtm.on_fill(order_idx, frame.at[order_idx, 'token'], frame.at[order_idx, 'signal'],
+                            frame.at[order_idx, 'quantity'], price)
+                # Part of the MTM open notional from here on
+                kill_switch.release(order_idx)
+            elif curr_order_status == 'REJECTED':
+                kill_switch.release(order_idx)
+                frame.loc[order_idx, 'active'] = 'N'
+                logger.debug(f"order_update: Updated Entry Rejection Status Params:\n{frame}")
+            elif curr_order_status == 'CANCELED':
+                kill_switch.release(order_idx)
+
+        elif order_type == TARGET_LEG:
             price = float(curr_order.get("prc", -1))
             if price == 0.0:
                 price = float(curr_order.get("avgprc", -1))
-            params.loc[order_idx, ['target_order_id', 'target_order_status', 'target_ts', 'target_price']] = (
-                curr_order_id, curr_order_status, curr_order_ts, price)
-            logger.debug(f"order_update: Updated Target Params:\n{params}")
+            set_values(frame, order_idx, ['target_order_id', 'target_order_status', 'target_ts', 'target_price'],
+                       (curr_order_id, curr_order_status, curr_order_ts, price))
+            logger.debug(f"order_update: Updated Target Params:\n{frame}")
 
             if curr_order_status == 'TARGET-HIT':
-                params.loc[order_idx, 'active'] = 'N'
-                logger.debug(f"order_update: Updated Target Completion Status Params:\n{params}")
+                mtm.on_exit(order_idx, price)
+                frame.loc[order_idx, 'active'] = 'N'
+                logger.debug(f"order_update: Updated Target Completion Status Params:\n{frame}")
 
-        elif order_type == 'SL_LEG':
+        elif order_type == SL_LEG:
             price = float(curr_order.get("trgprc", -1))
-            params.loc[order_idx, ['sl_order_id', 'sl_order_status', 'sl_ts', 'sl_price']] = (
-                curr_order_id, curr_order_status, curr_order_ts, price)
-            logger.debug(f"order_update: Updated SL Params:\n{params}")
+            set_values(frame, order_idx, ['sl_order_id', 'sl_order_status', 'sl_ts', 'sl_price'],
+                       (curr_order_id, curr_order_status, curr_order_ts, price))
+            logger.debug(f"order_update: Updated SL Params:\n{frame}")
 
             if curr_order_status == 'SL-HIT':
-                params.loc[order_idx, 'active'] = 'N'
-                logger.debug(f"order_update: Updated SL Completion Status Params:\n{params}")
+                mtm.on_exit(order_idx, float(curr_order.get("avgprc", price)))
+                frame.loc[order_idx, 'active'] = 'N'
+                logger.debug(f"order_update: Updated SL Completion Status Params:\n{frame}")
             elif curr_order_status == 'TRIGGER_PENDING':
-                params.loc[order_idx, 'sl_update_cnt'] += 1
-                logger.debug(f"order_update: Updated SL Update Count Params:\n{params}")
-                rejected, reason = api.is_sl_update_rejected(curr_order_id)
-                if rejected:
-                    logger.debug(f"order_update: Rejected SL Order:\n{curr_order_id}")
-                    params.loc[order_idx, 'active'] = 'S'
-                    logger.debug(f"order_update: Updated SL Update Count Params:\n{params}")
+                frame.loc[order_idx, 'sl_update_cnt'] += 1
+                logger.debug(f"order_update: Updated SL Update Count Params:\n{frame}")
+                sl_tracker.on_update(order_idx, curr_order)
+
+        if frame.loc[order_idx, 'active'] != 'Y':
+            square_off.confirm(order_idx)
+            subscriptions.update(frame, frame.at[order_idx, 'token'])
     else:
         logger.debug(f"Skipping order update for {curr_order_id}")
 
 
+def event_handler_order_update(curr_order):
+    global params
+    process_order_update(params, curr_order)
+
+
+def __mark_sl_rejected(idx, order_id, reason):
+    with params_lock:
+        logger.debug(f"order_update: Rejected SL Order:\n{order_id}, Reason: {reason}")
+        params.loc[idx, 'active'] = 'S'
+        logger.debug(f"order_update: Updated SL Update Count Params:\n{params}")
+        subscriptions.update(params, params.at[idx, 'token'])
+
+
+sl_tracker = SlModifyTracker(api=api, on_rejected=__mark_sl_rejected)
+
+
+def __build_status(params_copy: pd.DataFrame, mtm_snapshot: dict, kill_switch_status: dict):
+    metrics = {'broker': api.limiter.metrics(), 'quotes': getattr(quotes, 'stats', None),
+               'order_updates': getattr(order_updates, 'stats', None), 'sl_tracker': sl_tracker.stats,
+               'latency': {'tick_to_order': tick_to_order.snapshot(), 'order_update': order_update_latency.snapshot()}}
+    return build_status(acct=state_acct, params=params_copy, mtm=mtm_snapshot, kill_switch=kill_switch_status,
+                        metrics=metrics)
+
+
+def __publish_state(force: bool = False):
+    """
+    Publishes the status & exports the shm state from a single params copy & MTM snapshot, taken only if anything
+    changed since the last one (the shm heartbeat is kept up regardless)
+    """
+    if STATUS_PORT <= 0 and not shm_state.is_open:
+        return
+    state = {}
+
+    def build():
+        state.update(params=__params_snapshot(), mtm=mtm.snapshot(), kill_switch=kill_switch.status())
+        return __build_status(state['params'], state['mtm'], state['kill_switch'])
+
+    if status.refresh(build, force=force) and shm_state.is_open:
+        shm_state.update(params=state['params'], mtm=state['mtm'], tripped=state['kill_switch']['tripped'])
+    else:
+        shm_state.heartbeat()
+
+
 def event_handler_error(message):
     logger.error(f"Error message {message}")
-    send_email(body=f"Error in websocket {message}", subject=f"Websocket Error! - {acct}")
+    alerts.alert(subject=f"Websocket Error! - {state_acct}", body=f"Error in websocket {message}", acct=acct)
     sys.exit()
 
 
@@ -228,8 +357,8 @@ def __store_params():
     global params
     order_date = str(TODAY)
     if len(params) > 0:
-        ls.log_entry(log_type=PARAMS_LOG_TYPE, keys=["Pre-COB"], data=params, log_date=order_date, acct=acct)
-        logger.info(f"__store_params: Orders created for {acct}")
+        ls.log_entry(log_type=PARAMS_LOG_TYPE, keys=["Pre-COB"], data=params, log_date=order_date, acct=state_acct)
+        logger.info(f"__store_params: Orders created for {state_acct}")
     else:
         logger.error(f"__store_params: No Params found to store")
 
@@ -247,43 +376,103 @@ def start(acct_param: str, post_proc: bool = False):
     global api
     global params
     global acct
+    global state_acct
+    global order_templates
+    global order_updates
+    global quotes
     acct = acct_param
+    state_acct = f"{acct}{PAPER_SUFFIX}" if MOCK else acct
     target_time_ist = IST.localize(datetime.datetime.strptime("15:15", "%H:%M")).time()
     alert_time_ist = IST.localize(datetime.datetime.strptime("09:30", "%H:%M")).time()
     store_bod_params = True
 
+    if MOCK and not isinstance(api, PaperBroker):
+        api = PaperBroker(api)
+        square_off.api = api
+        sl_tracker.api = api
+        subscriptions.api = api
+        logger.info(f"Paper trading {acct}: Orders will be simulated, state persisted as {state_acct}")
+
     ret = api.api_login()
     logger.info(f"API Login: {ret}")
     if ret is None:
         raise Exception("Unable to login to broker API")
 
-    params = load_params(api=api, log_service=ls, acct=acct, rc=rc)
+    alerts.start()
+    # Pending alerts are sent even if the process exits from a callback
+    atexit.register(alerts.stop)
+    ls.start()
+    params = load_params(api=api, log_service=ls, acct=acct, rc=rc, log_acct=state_acct)
+    if MOCK:
+        api.register_instruments(params)
+    order_templates = build_order_templates(params=params, acct=acct, rc=rc)
+    order_index.build(params)
+    mtm.acct = state_acct
+    kill_switch.acct = state_acct
+    kill_switch.set_limits(get_kill_switch_limits(acct))
+    mtm.load(params)
 
     if len(params) == 0:
         logger.error("No Params entries")
+        ls.stop()
         return
 
     if len(params.loc[params.active == 'Y']) == 0:
         __store_params()
         logger.error("No Active Params entries")
+        ls.stop()
         return
 
-    api.api_start_websocket(subscribe_callback=event_handler_quote_update,
+    order_updates = OrderUpdatePipeline(handler=event_handler_order_update, lock=params_lock,
+                                        latency=order_update_latency)
+    quotes = QuoteConflator(handler=event_handler_quote_update)
+    order_updates.start()
+    sl_tracker.start()
+    quotes.start()
+    if SHM_EXPORT:
+        shm_state.open(state_acct)
+    __publish_state(force=True)
+    if STATUS_PORT > 0:
+        status.start()
+    api.api_start_websocket(subscribe_callback=quotes.submit,
                             socket_open_callback=event_handler_open_callback,
                             socket_error_callback=event_handler_error,
-                            order_update_callback=event_handler_order_update
+                            order_update_callback=order_updates.submit
                             )
 
     while datetime.datetime.now(IST).time() <= target_time_ist:
         if store_bod_params and datetime.datetime.now(IST).time() >= alert_time_ist:
-            ls.log_entry(log_type=PARAMS_LOG_TYPE, keys=["Post-BOD"], data=params,
-                         acct=acct, log_date=S_TODAY)
-            store_param_hist(trader_db=trader_db, acct=acct, cob_date=S_TODAY, params=params)
+            bod_params = __params_snapshot()
+            ls.log_entry(log_type=PARAMS_LOG_TYPE, keys=["Post-BOD"], data=bod_params,
+                         acct=state_acct, log_date=S_TODAY)
+            if not MOCK:
+                # Params hist is the live account's record
+                store_param_hist(trader_db=get_trader_db(), acct=acct, cob_date=S_TODAY, params=bod_params)
             store_bod_params = False
+        sl_tracker.check_timeouts()
+        mtm.publish()
+        __publish_state()
+        if kill_switch.tripped:
+            logger.error(f"Kill switch tripped, squaring off: {kill_switch.status()}")
+            alerts.alert(subject=f"Kill switch! - {state_acct}", body=f"Kill switch tripped: {kill_switch.reason}",
+                         acct=acct)
+            break
         time.sleep(1)
 
+    quotes.stop()
     __close_all_trades()
+    order_updates.stop()
+    sl_tracker.stop()
+    mtm.publish(force=True)
+    __publish_state(force=True)
+    shm_state.close()
+    logger.info(f"Broker rate limiter metrics: {api.limiter.metrics()}")
+    if MOCK:
+        logger.info(f"Paper broker stats: {api.stats}")
     __store_params()
+    ls.stop()
+    status.stop()
+    alerts.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from commons.config.reader import cfg
+
+logger = logging.getLogger(__name__)
+
+ORDER_WINDOW = 60
+
+
+def get_kill_switch_limits(acct: str):
+    """
+    Account limits from the kill-switch config i.e. the defaults overridden by the account entry (if any)
+    Args:
+        acct: Account
+
+    Returns: dict of max_loss, max_open_notional & max_orders_per_minute - None / missing is no limit
+
+    """
+    conf = cfg.get('kill-switch', {}) or {}
+    limits = dict(conf.get('defaults', {}) or {})
+    limits.update((conf.get('accounts', {}) or {}).get(acct, {}) or {})
+    return limits
+
+
+class KillSwitch:
+    """
+    Account wide guard over the incremental aggregates i.e. PnL (realized + unrealized), open notional & entry
+    orders per minute. Every check is O(1) - the MTM aggregates are pushed via the LiveMtm listener & the order
+    rate is a sliding window of the order times in the last minute.
+    Once tripped it stays tripped for the day - no new entries are allowed & the engine squares off.
+    Safe across the quote & order update threads - allow_entry checks & reserves (order slot & notional)
+    atomically, so concurrent entries can't both pass on the same headroom. The notional stays reserved till the
+    fill is part of the LiveMtm open notional (release post on_fill) or the entry is rejected / not placed i.e. a
+    burst of entries ahead of their fills is bounded too.
+    """
+
+    def __init__(self, acct: str = None, limits: dict = None):
+        self.acct = acct
+        self.lock = threading.Lock()
+        self.max_loss = None
+        self.max_open_notional = None
+        self.max_orders_per_minute = None
+        self.set_limits(limits or {})
+        self.orders = deque()
+        # Params idx -> (order slot time, notional) of the entries yet to fill
+        self.reservations = {}
+        self.reserved_notional = 0.0
+        self.open_notional = 0.0
+        self.pnl = 0.0
+        self.tripped = False
+        self.reason = None
+
+    def set_limits(self, limits: dict):
+        self.max_loss = limits.get('max_loss')
+        self.max_open_notional = limits.get('max_open_notional')
+        self.max_orders_per_minute = limits.get('max_orders_per_minute')
+        logger.info(f"KillSwitch: {self.acct} Limits: Max Loss: {self.max_loss}, "
+                    f"Max Open Notional: {self.max_open_notional}, "
+                    f"Max Orders per minute: {self.max_orders_per_minute}")
+
+    def trip(self, reason: str):
+        with self.lock:
+            if self.tripped:
+                return
+            self.tripped = True
+            self.reason = reason
+        logger.error(f"KillSwitch: {self.acct} Tripped: {reason}")
+
+    def on_mtm(self, realized: float, unrealized: float, open_notional: float):
+        """
+        LiveMtm listener - invoked on every fill, exit & tick
+        """
+        pnl = realized + unrealized
+        with self.lock:
+            self.pnl = pnl
+            self.open_notional = open_notional
+        if self.tripped:
+            return
+        if self.max_loss is not None and pnl <= -self.max_loss:
+            self.trip(f"PnL {pnl:.2f} breached max loss {self.max_loss}")
+        elif self.max_open_notional is not None and open_notional > self.max_open_notional:
+            self.trip(f"Open notional {open_notional:.2f} breached {self.max_open_notional}")
+
+    def __expire(self, now: float):
+        while len(self.orders) > 0 and now - self.orders[0] >= ORDER_WINDOW:
+            self.orders.popleft()
+
+    def allow_entry(self, idx, notional: float = 0.0):
+        """
+        Entry gate - False once tripped or if the entry would breach the open notional / order rate limits.
+        If allowed, the order slot & notional are reserved for the params row idx.
+        """
+        now = time.time()
+        with self.lock:
+            if self.tripped:
+                return False
+            open_notional = self.open_notional + self.reserved_notional
+            if self.max_open_notional is not None and open_notional + notional > self.max_open_notional:
+                logger.debug(f"KillSwitch: Entry of {notional:.2f} blocked, Open notional {open_notional:.2f}")
+                return False
+            self.__expire(now)
+            if self.max_orders_per_minute is not None and len(self.orders) >= self.max_orders_per_minute:
+                logger.debug(f"KillSwitch: Entry blocked, {len(self.orders)} orders in the last minute")
+                return False
+            self.orders.append(now)
+            self.__release(idx)
+            self.reservations[idx] = (now, notional)
+            self.reserved_notional += notional
+        return True
+
+    def __release(self, idx):
+        """
+        Drops the notional reservation of idx; called under the lock
+        Returns: (order slot time, notional) or None
+        """
+        reservation = self.reservations.pop(idx, None)
+        if reservation is not None:
+            self.reserved_notional = max(self.reserved_notional - reservation[1], 0.0)
+        return reservation
+
+    def on_order(self, idx, placed: bool = True):
+        """
+        To be called post every entry order attempt for idx. An order not placed (no broker response) neither counts
+        towards the order rate nor holds its notional; a placed order keeps its notional reserved till release.
+        """
+        now = time.time()
+        with self.lock:
+            self.__expire(now)
+            if not placed:
+                reservation = self.__release(idx)
+                if reservation is not None and reservation[0] in self.orders:
+                    self.orders.remove(reservation[0])
+                return
+            if idx not in self.reservations:
+                # Placed without a reservation
+                self.orders.append(now)
+            count = len(self.orders)
+        if self.max_orders_per_minute is not None and count > self.max_orders_per_minute:
+            self.trip(f"{count} orders in the last minute breached {self.max_orders_per_minute}")
+
+    def release(self, idx):
+        """
+        To be called once the entry of idx is filled (post LiveMtm.on_fill) or is rejected / cancelled
+        """
+        with self.lock:
+            self.__release(idx)
+
+    def status(self):
+        with self.lock:
+            return {'acct': self.acct, 'tripped': self.tripped, 'reason': self.reason, 'pnl': self.pnl,
+                    'open_notional': self.open_notional, 'reserved_notional': self.reserved_notional,
+                    'orders_last_minute': len(self.orders)}
@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+
+import pandas as pd
+from commons.service.LogService import LogService
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = 64
+MAX_BATCH = 32
+
+_STOP = object()
+
+
+class AsyncLogService:
+    """
+    LogService sink with a bounded queue & a background writer.
+    log_entry only snapshots the data & enqueues it; the writer drains whatever is queued (up to MAX_BATCH) &
+    merges the entries of a log type for the same keys, account & date into a single write (frames concatenated).
+    A full queue blocks the caller (backpressure) instead of growing unbounded - outside the lock, so stop & the
+    other callers are never held up by it. Till start is called (& post stop) entries are written synchronously on
+    the caller's thread.
+    """
+
+    def __init__(self, log_service: LogService, max_queue: int = MAX_QUEUE, max_batch: int = MAX_BATCH):
+        self.log_service = log_service
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.running = False
+        # Callers between the running check & the (possibly blocking) put - the writer drains them before exiting
+        self.putting = 0
+        self.thread = None
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'errors': 0, 'max_depth': 0}
+
+    def __write(self, entry: dict):
+        try:
+            self.log_service.log_entry(**entry)
+            self.stats['written'] += 1
+        except Exception as ex:
+            self.stats['errors'] += 1
+            logger.exception(f"AsyncLogService: Error writing {entry.get('log_type')} {entry.get('keys')}: {ex}")
+
+    def log_entry(self, **kwargs):
+        """
+        Same signature as LogService.log_entry
+        """
+        data = kwargs.get('data')
+        if isinstance(data, pd.DataFrame):
+            # The caller is free to keep mutating its frame
+            kwargs['data'] = data.copy()
+        with self.lock:
+            running = self.running
+            if running:
+                self.putting += 1
+        if not running:
+            self.__write(kwargs)
+            return
+        try:
+            self.queue.put(kwargs)
+        finally:
+            with self.lock:
+                self.putting -= 1
+                self.stats['queued'] += 1
+                self.stats['max_depth'] = max(self.stats['max_depth'], self.queue.qsize())
+
+    def __next_batch(self, timeout: float = None):
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def merge(entries: list):
+        """
+        Merges the entries with the same log type, keys, account & log date into one i.e. DataFrames concatenated
+        in order; entries with other (or no) data are left as is
+        Returns: list of entries to write
+        """
+        merged = []
+        groups = {}
+        for entry in entries:
+            if not isinstance(entry.get('data'), pd.DataFrame):
+                merged.append([entry])
+                continue
+            key = (entry.get('log_type'), str(entry.get('keys')), entry.get('acct'), str(entry.get('log_date')))
+            if key in groups:
+                groups[key].append(entry)
+            else:
+                groups[key] = [entry]
+                merged.append(groups[key])
+        return [group[0] if len(group) == 1 else
+                dict(group[0], data=pd.concat([entry['data'] for entry in group], ignore_index=True))
+                for group in merged]
+
+    def __run(self):
+        stopping = False
+        while True:
+            batch = self.__next_batch(timeout=0.1 if stopping else None)
+            entries = [entry for entry in batch if entry is not _STOP]
+            stopping |= len(entries) < len(batch)
+            writes = self.merge(entries)
+            if len(writes) < len(entries):
+                logger.debug(f"AsyncLogService: Merged {len(entries)} entries into {len(writes)} writes")
+            for entry in writes:
+                self.__write(entry)
+            if len(entries) > 0:
+                self.stats['batches'] += 1
+            for _ in batch:
+                self.queue.task_done()
+            if stopping:
+                with self.lock:
+                    if self.putting == 0 and self.queue.empty():
+                        break
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="AsyncLogService", daemon=True)
+        self.thread.start()
+
+    def flush(self):
+        """
+        Blocks till all the queued entries are written
+        """
+        self.queue.join()
+
+    def stop(self):
+        """
+        Flushes the queued entries & stops the writer
+        """
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
+        logger.info(f"AsyncLogService: Stats {self.stats}")
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_INTERVAL = 60
+
+
+class _TokenBook:
+    __slots__ = ['ltp', 'open_qty', 'open_cost', 'unrealized', 'realized', 'rows']
+
+    def __init__(self):
+        self.ltp = None
+        # Signed (signal * quantity) open quantity & cost - unrealized = ltp * open_qty - open_cost
+        self.open_qty = 0.0
+        self.open_cost = 0.0
+        self.unrealized = 0.0
+        self.realized = 0.0
+        self.rows = set()
+
+
+class LiveMtm:
+    """
+    Incremental intraday MTM per row, token & account.
+    Every token keeps running sums of its open signed quantity & cost so a tick is O(1) for the token and the
+    account totals are adjusted by the token delta i.e. the book is never rescanned.
+    Shared by the quote & order update threads - every update & snapshot is under the lock (listeners are invoked
+    under it too).
+    """
+
+    def __init__(self, acct: str = None, publish_interval: float = PUBLISH_INTERVAL):
+        self.acct = acct
+        self.publish_interval = publish_interval
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.rows = {}
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.open_notional = 0.0
+        self.last_publish = 0.0
+        self.last_snapshot = None
+        self.listeners = []
+
+    def add_listener(self, listener: Callable):
+        """
+        listener(realized, unrealized, open_notional) is invoked post every change - to be kept O(1)
+        """
+        self.listeners.append(listener)
+
+    def __notify(self):
+        for listener in self.listeners:
+            listener(self.realized, self.unrealized, self.open_notional)
+
+    def __book(self, token) -> _TokenBook:
+        book = self.tokens.get(token)
+        if book is None:
+            book = _TokenBook()
+            self.tokens[token] = book
+        return book
+
+    def __revalue(self, book: _TokenBook):
+        unrealized = 0.0 if book.ltp is None else book.ltp * book.open_qty - book.open_cost
+        self.unrealized += unrealized - book.unrealized
+        book.unrealized = unrealized
+
+    def on_fill(self, idx, token, signal: int, quantity: int, price: float):
+        """
+        Entry leg filled
+        """
+        with self.lock:
+            if idx in self.rows:
+                return
+            book = self.__book(token)
+            signed_qty = signal * quantity
+            self.rows[idx] = {'token': token, 'signal': signal, 'quantity': quantity, 'entry_price': price,
+                              'exit_price': None, 'realized': 0.0}
+            book.rows.add(idx)
+            book.open_qty += signed_qty
+            book.open_cost += signed_qty * price
+            self.open_notional += abs(signed_qty * price)
+            self.__revalue(book)
+            self.__notify()
+
+    def on_exit(self, idx, price: float):
+        """
+        SL / Target leg completed
+        """
+        with self.lock:
+            row = self.rows.get(idx)
+            if row is None or row['exit_price'] is not None:
+                return
+            book = self.tokens[row['token']]
+            signed_qty = row['signal'] * row['quantity']
+            row['exit_price'] = price
+            row['realized'] = signed_qty * (price - row['entry_price'])
+            book.open_qty -= signed_qty
+            book.open_cost -= signed_qty * row['entry_price']
+            if book.open_qty == 0:
+                book.open_cost = 0.0
+            book.realized += row['realized']
+            self.realized += row['realized']
+            self.open_notional -= abs(signed_qty * row['entry_price'])
+            self.__revalue(book)
+            self.__notify()
+
+    def on_tick(self, token, ltp: float):
+        with self.lock:
+            book = self.tokens.get(token)
+            if book is None:
+                return
+            book.ltp = ltp
+            if book.open_qty != 0:
+                self.__revalue(book)
+                self.__notify()
+
+    def load(self, params: pd.DataFrame):
+        """
+        Seeds the open & closed rows post a (re)start from the params
+        """
+        entered = params.loc[params.entry_order_status == 'ENTERED']
+        for idx, row in entered.iterrows():
+            self.on_fill(idx, row['token'], row['signal'], row['quantity'], float(row['entry_price']))
+            if row['sl_order_status'] == 'SL-HIT':
+                self.on_exit(idx, float(row['sl_price']))
+            elif row['target_order_status'] == 'TARGET-HIT':
+                self.on_exit(idx, float(row['target_price']))
+
+    def snapshot(self):
+        with self.lock:
+            rows = {}
+            for idx, row in self.rows.items():
+                ltp = self.tokens[row['token']].ltp
+                unrealized = 0.0
+                if row['exit_price'] is None and ltp is not None:
+                    unrealized = row['signal'] * row['quantity'] * (ltp - row['entry_price'])
+                rows[idx] = {'token': row['token'], 'realized': row['realized'], 'unrealized': unrealized}
+            tokens = {token: {'ltp': book.ltp, 'realized': book.realized, 'unrealized': book.unrealized}
+                      for token, book in self.tokens.items()}
+            return {'acct': self.acct, 'ts': time.time(),
+                    'realized': self.realized, 'unrealized': self.unrealized,
+                    'pnl': self.realized + self.unrealized, 'open_notional': self.open_notional,
+                    'tokens': tokens, 'rows': rows}
+
+    def publish(self, force: bool = False):
+        """
+        Publishes (logs & retains) the snapshot at most once per publish interval
+        """
+        now = time.time()
+        with self.lock:
+            if not force and now - self.last_publish < self.publish_interval:
+                return self.last_snapshot
+            self.last_publish = now
+        self.last_snapshot = self.snapshot()
+        logger.info(f"LiveMtm: {self.acct} Realized: {self.last_snapshot['realized']:.2f}, "
+                    f"Unrealized: {self.last_snapshot['unrealized']:.2f}, "
+                    f"Open Notional: {self.last_snapshot['open_notional']:.2f}")
+        return self.last_snapshot
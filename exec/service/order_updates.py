@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from commons.utils.Misc import get_epoch
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW = 0.05
+# Fields identifying a broker state transition - redelivered / replayed messages repeat them. exch_tm only has second
+# resolution, hence the prices & quantity tell apart e.g. two SL modifies of an order within the same second
+DEDUP_FIELDS = ('norenordno', 'status', 'reporttype', 'exch_tm', 'fillshares', 'trgprc', 'prc', 'qty')
+DEDUP_TTL = 300.0
+DEDUP_MAX_KEYS = 10000
+
+
+class OrderUpdatePipeline:
+    """
+    Sits between the websocket order feed and the order update handler.
+    1. Drops duplicates of an update seen within the last dedup_ttl secs (bounded to dedup_max_keys, LRU)
+    2. Orders the updates of every order (norenordno) by exchange time & drops ones older than already applied
+    3. Coalesces a burst into the latest update per order i.e. one state transition per leg
+    Only then is the handler invoked (under the params lock if one is given). The receive to applied latency of every
+    applied update is recorded in the latency histogram (if given).
+    """
+
+    def __init__(self, handler: Callable, lock=None, window: float = COALESCE_WINDOW, dedup_ttl: float = DEDUP_TTL,
+                 dedup_max_keys: int = DEDUP_MAX_KEYS, latency=None):
+        self.handler = handler
+        self.latency = latency
+        self.lock = lock
+        self.window = window
+        self.dedup_ttl = dedup_ttl
+        self.dedup_max_keys = dedup_max_keys
+        self.cond = threading.Condition()
+        # (monotonic receive time, message)
+        self.pending = []
+        # key -> monotonic time first seen, oldest first
+        self.seen = OrderedDict()
+        self.last_ts = {}
+        self.stats = {'received': 0, 'duplicate': 0, 'stale': 0, 'coalesced': 0, 'applied': 0}
+        self.running = False
+        self.thread = None
+
+    @staticmethod
+    def message_key(message: dict):
+        return tuple(str(message.get(field)) for field in DEDUP_FIELDS)
+
+    def __is_duplicate(self, key: tuple, now: float):
+        """
+        Checks & records the key; called under cond
+        """
+        seen = self.seen
+        while len(seen) > 0:
+            oldest_ts = next(iter(seen.values()))
+            if now - oldest_ts <= self.dedup_ttl and len(seen) < self.dedup_max_keys:
+                break
+            seen.popitem(last=False)
+        if key in seen:
+            return True
+        seen[key] = now
+        return False
+
+    @staticmethod
+    def message_ts(message: dict):
+        exch_tm = message.get('exch_tm')
+        if exch_tm is None:
+            return 0
+        return get_epoch(exch_tm)
+
+    def submit(self, message: dict):
+        """
+        Websocket order update callback - only queues the message
+        """
+        key = self.message_key(message)
+        now = time.monotonic()
+        with self.cond:
+            self.stats['received'] += 1
+            if self.__is_duplicate(key, now):
+                self.stats['duplicate'] += 1
+                logger.debug(f"OrderUpdatePipeline: Dropping duplicate update for {message.get('norenordno')}")
+                return
+            self.pending.append((now, message))
+            self.cond.notify()
+
+    def coalesce(self, messages: list):
+        """
+        Groups the messages by order, sorts each group by exchange time (stable i.e. arrival order for ties)
+        and returns the latest non-stale message per order in order of first arrival.
+        """
+        groups = {}
+        for message in messages:
+            groups.setdefault(message.get('norenordno'), []).append(message)
+        result = []
+        for order_id, updates in groups.items():
+            updates.sort(key=self.message_ts)
+            latest = updates[-1]
+            latest_ts = self.message_ts(latest)
+            # Updates without exchange time (e.g. acks) can't be ordered, hence never stale
+            if 0 < latest_ts < self.last_ts.get(order_id, 0):
+                self.stats['stale'] += len(updates)
+                logger.debug(f"OrderUpdatePipeline: Dropping {len(updates)} stale updates for {order_id}")
+                continue
+            self.last_ts[order_id] = max(latest_ts, self.last_ts.get(order_id, 0))
+            self.stats['coalesced'] += len(updates) - 1
+            result.append(latest)
+        return result
+
+    def drain(self):
+        with self.cond:
+            pending = self.pending
+            self.pending = []
+        if len(pending) == 0:
+            return 0
+        recv_ts = {id(message): ts for ts, message in pending}
+        updates = self.coalesce([message for _, message in pending])
+        for message in updates:
+            try:
+                if self.lock is not None:
+                    with self.lock:
+                        self.handler(message)
+                else:
+                    self.handler(message)
+                self.stats['applied'] += 1
+                if self.latency is not None:
+                    self.latency.record(time.monotonic() - recv_ts[id(message)])
+            except Exception as ex:
+                logger.exception(f"OrderUpdatePipeline: Error applying {message}: {ex}")
+        return len(updates)
+
+    def process(self, messages: list):
+        """
+        Synchronously pushes a list of messages through the pipeline e.g. replay of a burst
+        """
+        for message in messages:
+            self.submit(message)
+        return self.drain()
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.pending) == 0:
+                    self.cond.wait()
+                if not self.running:
+                    break
+            # Let the rest of the burst arrive before applying
+            time.sleep(self.window)
+            self.drain()
+        self.drain()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="OrderUpdatePipeline", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stops the worker post applying everything already queued
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.drain()
+        logger.info(f"OrderUpdatePipeline: Stats {self.stats}")
+
+    def reset(self):
+        with self.cond:
+            self.pending = []
+            self.seen = OrderedDict()
+            self.last_ts = {}
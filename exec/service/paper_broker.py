@@ -0,0 +1,242 @@
+import datetime
+import itertools
+import logging
+import threading
+
+import pandas as pd
+from commons.consts.consts import IST
+
+logger = logging.getLogger(__name__)
+
+# Paper order numbers - well clear of the broker's (date prefixed) ones
+ORDER_NO_START = 900000000000000
+
+
+class _Bracket:
+    """
+    Simulated bracket order i.e. an entry leg & once filled, the SL (snoordt 1) & target (snoordt 0) legs
+    """
+    __slots__ = ['entry_no', 'sl_no', 'target_no', 'token', 'exchange', 'symbol', 'signal', 'quantity', 'remarks',
+                 'sl_range', 'target_range', 'entry_price', 'sl_trigger', 'target_price', 'state']
+
+    def __init__(self, entry_no, token, exchange, symbol, signal, quantity, remarks, sl_range, target_range):
+        self.entry_no = entry_no
+        self.sl_no = None
+        self.target_no = None
+        self.token = token
+        self.exchange = exchange
+        self.symbol = symbol
+        self.signal = signal
+        self.quantity = quantity
+        self.remarks = remarks
+        self.sl_range = float(sl_range)
+        self.target_range = float(target_range)
+        self.entry_price = None
+        self.sl_trigger = None
+        self.target_price = None
+        # PENDING -> OPEN (legs working) -> CLOSED
+        self.state = 'PENDING'
+
+
+class PaperBroker:
+    """
+    Paper execution on the live quote stream.
+    Wraps the broker (Shoonya) - login, quotes & subscriptions go to the broker while bracket order placement,
+    SL modifies & closes are simulated in process:
+        1. The entry (MKT) fills at the next tick of the instrument
+        2. The SL leg triggers when the tick crosses the trigger & fills at the tick
+        3. The target leg fills at its limit price when the tick crosses it; the other leg is then cancelled
+        4. A close fills the target leg at the last tick (MKT) & cancels the SL leg
+    Every transition is emitted as a broker format order update (as parsed by get_order_status_order_update) to the
+    order update callback, which is the only source of order updates i.e. the account's live updates are ignored.
+    """
+
+    def __init__(self, broker, order_no_start: int = ORDER_NO_START):
+        self.broker = broker
+        self.lock = threading.Lock()
+        self.order_nos = itertools.count(order_no_start)
+        self.tokens = {}
+        self.ltp = {}
+        self.brackets = {}
+        self.legs = {}
+        self.order_book = {}
+        self.order_update_callback = None
+        self.stats = {'placed': 0, 'filled': 0, 'sl_hit': 0, 'target_hit': 0, 'closed': 0, 'modified': 0}
+
+    def __getattr__(self, name):
+        return getattr(self.broker, name)
+
+    def register_instruments(self, params: pd.DataFrame):
+        """
+        (exchange, trading symbol) -> token of the params i.e. the instruments orders can be placed for
+        """
+        with self.lock:
+            for row in params[['exchange', 'symbol', 'token']].drop_duplicates().itertuples(index=False):
+                self.tokens[(row.exchange, row.symbol)] = str(row.token)
+
+    @staticmethod
+    def __exch_tm():
+        return datetime.datetime.now(IST).strftime('%d-%m-%Y %H:%M:%S')
+
+    def __message(self, bracket: _Bracket, order_no: str, status: str, report_type: str, leg: str = None, **fields):
+        """
+        Order update for a leg of the bracket; leg: None (entry), 'SL' or 'TARGET'
+        """
+        signal = bracket.signal if leg is None else -bracket.signal
+        message = {'t': 'om', 'norenordno': order_no, 'exch': bracket.exchange, 'tsym': bracket.symbol,
+                   'trantype': 'B' if signal == 1 else 'S', 'qty': str(bracket.quantity), 'pcode': 'B', 'prd': 'B',
+                   'remarks': bracket.remarks, 'status': status, 'reporttype': report_type, 'ret': 'DAY',
+                   'exch_tm': self.__exch_tm()}
+        if leg is None:
+            message.update({'prctyp': 'MKT', 'prc': '0.00', 'blprc': f"{bracket.sl_range:.2f}",
+                            'bpprc': f"{bracket.target_range:.2f}"})
+        elif leg == 'SL':
+            message.update({'prctyp': 'SL-MKT', 'prc': '0.00', 'trgprc': f"{bracket.sl_trigger:.2f}",
+                            'snonum': bracket.entry_no, 'snoordt': '1'})
+        else:
+            message.update({'prctyp': 'LMT', 'prc': f"{bracket.target_price:.2f}", 'snonum': bracket.entry_no,
+                            'snoordt': '0'})
+        message.update(fields)
+        self.order_book[order_no] = message
+        return message
+
+    def __fill_entry(self, bracket: _Bracket, ltp: float):
+        bracket.entry_price = ltp
+        bracket.sl_trigger = ltp - bracket.signal * bracket.sl_range
+        bracket.target_price = ltp + bracket.signal * bracket.target_range
+        bracket.sl_no = str(next(self.order_nos))
+        bracket.target_no = str(next(self.order_nos))
+        self.legs[bracket.sl_no] = bracket
+        self.legs[bracket.target_no] = bracket
+        bracket.state = 'OPEN'
+        self.stats['filled'] += 1
+        return [self.__message(bracket, bracket.entry_no, 'COMPLETE', 'Fill', avgprc=f"{ltp:.2f}",
+                               flprc=f"{ltp:.2f}", fillshares=str(bracket.quantity)),
+                self.__message(bracket, bracket.sl_no, 'TRIGGER_PENDING', 'TriggerPending', leg='SL'),
+                self.__message(bracket, bracket.target_no, 'OPEN', 'New', leg='TARGET')]
+
+    def __exit(self, bracket: _Bracket, filled_leg: str, price: float, **fields):
+        bracket.state = 'CLOSED'
+        if filled_leg == 'SL':
+            filled_no, filled_report, cancel_no, cancel_leg = bracket.sl_no, 'Fill', bracket.target_no, 'TARGET'
+        else:
+            filled_no, filled_report, cancel_no, cancel_leg = bracket.target_no, 'Fill', bracket.sl_no, 'SL'
+        return [self.__message(bracket, cancel_no, 'CANCELED', 'Canceled', leg=cancel_leg,
+                               cancelqty=str(bracket.quantity)),
+                self.__message(bracket, filled_no, 'COMPLETE', filled_report, leg=filled_leg, avgprc=f"{price:.2f}",
+                               flprc=f"{price:.2f}", fillshares=str(bracket.quantity), **fields)]
+
+    def __simulate(self, token: str, ltp: float):
+        messages = []
+        for bracket in list(self.brackets.values()):
+            if bracket.token != token or bracket.state == 'CLOSED':
+                continue
+            if bracket.state == 'PENDING':
+                messages.extend(self.__fill_entry(bracket, ltp))
+            elif bracket.signal * (ltp - bracket.sl_trigger) <= 0:
+                self.stats['sl_hit'] += 1
+                messages.extend(self.__exit(bracket, 'SL', ltp))
+            elif bracket.signal * (ltp - bracket.target_price) >= 0:
+                self.stats['target_hit'] += 1
+                messages.extend(self.__exit(bracket, 'TARGET', bracket.target_price))
+        return messages
+
+    def __emit(self, messages: list):
+        if self.order_update_callback is None:
+            return
+        for message in messages:
+            logger.debug(f"PaperBroker: Order update {message}")
+            self.order_update_callback(dict(message))
+
+    def on_quote(self, data: dict):
+        """
+        Fills / triggers the paper orders of the tick's instrument
+        """
+        ltp = data.get('lp')
+        if ltp is None:
+            return
+        token = str(data.get('tk'))
+        with self.lock:
+            self.ltp[token] = float(ltp)
+            messages = self.__simulate(token, float(ltp))
+        self.__emit(messages)
+
+    def api_start_websocket(self, subscribe_callback, socket_open_callback, socket_error_callback,
+                            order_update_callback):
+        self.order_update_callback = order_update_callback
+
+        def paper_quote_callback(data):
+            self.on_quote(data)
+            subscribe_callback(data)
+
+        def live_order_update(message):
+            logger.debug(f"PaperBroker: Ignoring live order update {message.get('norenordno')}")
+
+        return self.broker.api_start_websocket(subscribe_callback=paper_quote_callback,
+                                               socket_open_callback=socket_open_callback,
+                                               socket_error_callback=socket_error_callback,
+                                               order_update_callback=live_order_update)
+
+    def api_place_order(self, buy_or_sell, product_type, exchange, trading_symbol, quantity, disclose_qty,
+                        price_type, price=0.0, trigger_price=None, retention='DAY', remarks=None,
+                        book_loss_price=0.0, book_profit_price=0.0, **kwargs):
+        with self.lock:
+            token = self.tokens.get((exchange, trading_symbol))
+            if token is None:
+                logger.error(f"PaperBroker: Unknown instrument {exchange}:{trading_symbol}")
+                return None
+            order_no = str(next(self.order_nos))
+            bracket = _Bracket(entry_no=order_no, token=token, exchange=exchange, symbol=trading_symbol,
+                               signal=1 if buy_or_sell == 'B' else -1, quantity=int(quantity), remarks=remarks,
+                               sl_range=book_loss_price, target_range=book_profit_price)
+            self.brackets[order_no] = bracket
+            self.stats['placed'] += 1
+            messages = [self.__message(bracket, order_no, 'OPEN', 'New')]
+        self.__emit(messages)
+        return {'stat': 'Ok', 'norenordno': order_no}
+
+    def api_modify_order(self, exchange, trading_symbol, order_no, new_quantity, new_price_type,
+                         new_price=0.0, new_trigger_price=None, **kwargs):
+        with self.lock:
+            bracket = self.legs.get(str(order_no))
+            if bracket is None or bracket.state != 'OPEN' or str(order_no) != bracket.sl_no:
+                logger.error(f"PaperBroker: No open SL leg {order_no} to modify")
+                return None
+            bracket.sl_trigger = float(new_trigger_price)
+            self.stats['modified'] += 1
+            messages = [self.__message(bracket, bracket.sl_no, 'TRIGGER_PENDING', 'Replaced', leg='SL')]
+            ltp = self.ltp.get(bracket.token)
+            if ltp is not None and bracket.signal * (ltp - bracket.sl_trigger) <= 0:
+                # Trail past the last tick triggers right away
+                self.stats['sl_hit'] += 1
+                messages.extend(self.__exit(bracket, 'SL', ltp))
+        self.__emit(messages)
+        return {'stat': 'Ok', 'result': str(order_no)}
+
+    def api_close_bracket_order(self, order_no):
+        with self.lock:
+            bracket = self.brackets.get(str(order_no))
+            if bracket is None or bracket.state == 'CLOSED':
+                logger.error(f"PaperBroker: No open bracket {order_no} to close")
+                return None
+            if bracket.state == 'PENDING':
+                bracket.state = 'CLOSED'
+                messages = [self.__message(bracket, bracket.entry_no, 'CANCELED', 'Canceled',
+                                           cancelqty=str(bracket.quantity))]
+            else:
+                self.stats['closed'] += 1
+                ltp = self.ltp.get(bracket.token, bracket.entry_price)
+                # Target leg converted to MKT
+                messages = self.__exit(bracket, 'TARGET', ltp, prc='0.00', prctyp='MKT')
+        self.__emit(messages)
+        return {'stat': 'Ok', 'result': str(order_no)}
+
+    def is_sl_update_rejected(self, order_id):
+        # Paper modifies are applied (or rejected with a None response) synchronously
+        return False, None
+
+    def api_get_order_book(self):
+        with self.lock:
+            if len(self.order_book) == 0:
+                return None
+            return [dict(message) for message in self.order_book.values()]
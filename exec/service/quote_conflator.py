@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Monotonic receive time of the (latest) tick in the slot, for the tick to order latency
+RECV_TS = 'recv_ts'
+
+
+class QuoteConflator:
+    """
+    Decouples the websocket quote feed from quote processing.
+    Every token has a single latest-value slot; a tick arriving before the previous one for the token is processed
+    is merged into the slot (newer fields win) i.e. conflated. The worker only ever processes the latest quote
+    per token hence latency is bounded by the number of tokens and not the tick rate.
+    """
+
+    def __init__(self, handler: Callable):
+        self.handler = handler
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.stats = {'received': 0, 'conflated': 0, 'processed': 0, 'max_pending': 0}
+        self.running = False
+        self.thread = None
+
+    def submit(self, data: dict):
+        """
+        Websocket quote callback
+        """
+        token = data.get('tk')
+        now = time.monotonic()
+        with self.cond:
+            self.stats['received'] += 1
+            slot = self.pending.get(token)
+            if slot is None:
+                slot = dict(data)
+                self.pending[token] = slot
+                self.stats['max_pending'] = max(self.stats['max_pending'], len(self.pending))
+            else:
+                slot.update(data)
+                self.stats['conflated'] += 1
+            slot[RECV_TS] = now
+            self.cond.notify()
+
+    def drain(self):
+        with self.cond:
+            quotes = self.pending
+            self.pending = {}
+        for data in quotes.values():
+            try:
+                self.handler(data)
+            except Exception as ex:
+                logger.exception(f"QuoteConflator: Error processing {data}: {ex}")
+            self.stats['processed'] += 1
+        return len(quotes)
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.pending) == 0:
+                    self.cond.wait()
+                if not self.running:
+                    break
+            self.drain()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="QuoteConflator", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stops the worker; pending quotes are dropped as they are stale by now
+        """
+        with self.cond:
+            self.running = False
+            self.pending = {}
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        logger.info(f"QuoteConflator: Stats {self.stats}")
@@ -0,0 +1,241 @@
+import glob
+import logging
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SHM_DIR_ENV = 'ENGINE_SHM_DIR'
+FILE_PREFIX = 'trade-exec-'
+FILE_SUFFIX = '.state'
+MAGIC = b'TEXSTATE'
+LAYOUT_VERSION = 1
+MAX_ROWS = 512
+# Heartbeat older than this i.e. the engine is not running
+STALE_SECS = 5.0
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', 'u4'), ('pid', 'u4'), ('seq', 'u8'), ('heartbeat', 'f8'),
+                         ('updated', 'f8'), ('acct', 'S32'), ('rows', 'u4'), ('tripped', 'u1'),
+                         ('realized', 'f8'), ('unrealized', 'f8'), ('open_notional', 'f8')], align=True)
+ROW_DTYPE = np.dtype([('idx', 'i4'), ('scrip', 'S24'), ('model', 'S48'), ('token', 'S16'), ('signal', 'i1'),
+                      ('quantity', 'i4'), ('active', 'S1'), ('entry_status', 'S16'), ('sl_status', 'S16'),
+                      ('target_status', 'S16'), ('entry_price', 'f8'), ('sl_price', 'f8'), ('target_price', 'f8'),
+                      ('ltp', 'f8'), ('realized', 'f8'), ('unrealized', 'f8')], align=True)
+# Rows start on a cache line
+ROWS_OFFSET = (HEADER_DTYPE.itemsize + 63) // 64 * 64
+SEGMENT_SIZE = ROWS_OFFSET + MAX_ROWS * ROW_DTYPE.itemsize
+
+STR_COLS = {'scrip': 'scrip', 'model': 'model', 'token': 'token', 'active': 'active',
+            'entry_status': 'entry_order_status', 'sl_status': 'sl_order_status',
+            'target_status': 'target_order_status'}
+NUM_COLS = {'signal': 'signal', 'quantity': 'quantity', 'entry_price': 'entry_price', 'sl_price': 'sl_price',
+            'target_price': 'target_price'}
+
+
+def get_shm_dir():
+    path = os.environ.get(SHM_DIR_ENV)
+    if path is None:
+        # RAM backed on Linux
+        path = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return path
+
+
+def get_state_path(acct: str, shm_dir: str = None):
+    return os.path.join(get_shm_dir() if shm_dir is None else shm_dir, f"{FILE_PREFIX}{acct}{FILE_SUFFIX}")
+
+
+def _str_col(series: pd.Series):
+    return series.astype(object).where(series.notna(), '').astype(str).to_numpy()
+
+
+def _num_col(series: pd.Series):
+    return pd.to_numeric(series, errors='coerce').astype('float64').to_numpy()
+
+
+class ShmStateWriter:
+    """
+    Engine side of the shared memory state export - a fixed layout record array (header + MAX_ROWS rows) in a memory
+    mapped file per account. Updates are guarded by a sequence (seqlock) i.e. the seq is odd while a write is in
+    progress, so readers in other processes never need a lock or an IPC round trip.
+    """
+
+    def __init__(self, acct: str = None, path: str = None):
+        self.acct = acct
+        self.path = path
+        self.mm = None
+        self.header = None
+        self.rows = None
+
+    @property
+    def is_open(self):
+        return self.mm is not None
+
+    def open(self, acct: str = None):
+        if acct is not None:
+            self.acct = acct
+        if self.path is None:
+            self.path = get_state_path(self.acct)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(SEGMENT_SIZE)
+        # Readers only ever see a complete (possibly empty) segment
+        os.replace(tmp_path, self.path)
+        with open(self.path, 'r+b') as f:
+            self.mm = mmap.mmap(f.fileno(), SEGMENT_SIZE)
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self.mm, offset=0)
+        self.rows = np.ndarray((MAX_ROWS,), dtype=ROW_DTYPE, buffer=self.mm, offset=ROWS_OFFSET)
+        self.header['magic'] = MAGIC
+        self.header['version'] = LAYOUT_VERSION
+        self.header['pid'] = os.getpid()
+        self.header['acct'] = self.acct.encode()[:32]
+        self.heartbeat()
+        logger.info(f"ShmStateWriter: Exporting {self.acct} state to {self.path}")
+
+    def heartbeat(self):
+        if self.is_open:
+            self.header['heartbeat'] = time.time()
+
+    def update(self, params: pd.DataFrame, mtm: dict = None, tripped: bool = False):
+        """
+        Writes the params rows (first MAX_ROWS) along with the MTM snapshot
+        Args:
+            params: Consistent params copy
+            mtm: LiveMtm snapshot
+            tripped: Kill switch state
+        """
+        if not self.is_open:
+            return
+        if len(params) > MAX_ROWS:
+            logger.warning(f"ShmStateWriter: Exporting {MAX_ROWS} of {len(params)} rows")
+            params = params.iloc[:MAX_ROWS]
+        count = len(params)
+        mtm = {} if mtm is None else mtm
+        mtm_rows = mtm.get('rows', {})
+        tokens = mtm.get('tokens', {})
+
+        records = np.zeros(count, dtype=ROW_DTYPE)
+        records['idx'] = np.asarray(params.index, dtype='int64')
+        for field, col in STR_COLS.items():
+            if col in params.columns:
+                records[field] = _str_col(params[col])
+        for field, col in NUM_COLS.items():
+            if col in params.columns:
+                values = _num_col(params[col])
+                records[field] = values if ROW_DTYPE[field].kind == 'f' else np.nan_to_num(values)
+        tokens_col = params['token'].astype(str) if 'token' in params.columns else [''] * count
+        records['ltp'] = [np.nan if tokens.get(token, {}).get('ltp') is None else tokens[token]['ltp']
+                          for token in tokens_col]
+        records['realized'] = [mtm_rows.get(idx, {}).get('realized', 0.0) for idx in params.index]
+        records['unrealized'] = [mtm_rows.get(idx, {}).get('unrealized', 0.0) for idx in params.index]
+
+        header = self.header
+        header['seq'] += 1
+        self.rows[:count] = records
+        self.rows[count:] = np.zeros(1, dtype=ROW_DTYPE)
+        header['rows'] = count
+        header['tripped'] = bool(tripped)
+        header['realized'] = mtm.get('realized', 0.0)
+        header['unrealized'] = mtm.get('unrealized', 0.0)
+        header['open_notional'] = mtm.get('open_notional', 0.0)
+        header['updated'] = header['heartbeat'] = time.time()
+        header['seq'] += 1
+
+    def close(self):
+        """
+        Unmaps; the file is left behind with the last state (the stale heartbeat marks it as not running)
+        """
+        if not self.is_open:
+            return
+        self.header['pid'] = 0
+        self.header = None
+        self.rows = None
+        self.mm.close()
+        self.mm = None
+
+
+class ShmStateReader:
+    """
+    Monitor side - maps an account's state file read only; read returns a consistent copy (retries while the
+    writer is mid update)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), SEGMENT_SIZE, access=mmap.ACCESS_READ)
+        self.header = np.frombuffer(self.mm, dtype=HEADER_DTYPE, count=1, offset=0)
+        self.rows = np.frombuffer(self.mm, dtype=ROW_DTYPE, count=MAX_ROWS, offset=ROWS_OFFSET)
+        if self.header['magic'][0] != MAGIC or self.header['version'][0] != LAYOUT_VERSION:
+            self.close()
+            raise ValueError(f"ShmStateReader: {path} is not a v{LAYOUT_VERSION} state file")
+
+    def read(self, retries: int = 100):
+        """
+        Returns: (header dict, rows record array copy)
+        """
+        for _ in range(retries):
+            seq = int(self.header['seq'][0])
+            if seq % 2 == 1:
+                time.sleep(0)
+                continue
+            header = self.header[0].copy()
+            rows = self.rows[:int(header['rows'])].copy()
+            if int(self.header['seq'][0]) == seq:
+                header = {name: header[name].decode() if isinstance(header[name], bytes) else header[name].item()
+                          for name in HEADER_DTYPE.names}
+                header['alive'] = header['pid'] != 0 and time.time() - header['heartbeat'] <= STALE_SECS
+                return header, rows
+        raise TimeoutError(f"ShmStateReader: No consistent read of {self.path}")
+
+    def close(self):
+        self.header = None
+        self.rows = None
+        self.mm.close()
+
+
+def to_frame(rows: np.ndarray):
+    """
+    Rows record array as a DataFrame (str fields decoded)
+    """
+    df = pd.DataFrame(rows)
+    for col in df.columns:
+        if rows.dtype[col].kind == 'S':
+            df[col] = df[col].str.decode('utf-8')
+    return df.set_index('idx')
+
+
+def read_all_states(shm_dir: str = None):
+    """
+    Cross account view - every state file in the shm dir
+    Returns: dict of acct -> (header dict, rows record array)
+    """
+    states = {}
+    for path in sorted(glob.glob(os.path.join(get_shm_dir() if shm_dir is None else shm_dir,
+                                              f"{FILE_PREFIX}*{FILE_SUFFIX}"))):
+        try:
+            reader = ShmStateReader(path)
+        except (OSError, ValueError) as ex:
+            logger.warning(f"read_all_states: Skipping {path}: {ex}")
+            continue
+        try:
+            header, rows = reader.read()
+            states[header['acct']] = (header, rows)
+        finally:
+            reader.close()
+    return states
+
+
+if __name__ == '__main__':
+    # Minimal cross account monitor
+    while True:
+        for acct_, (header_, rows_) in read_all_states().items():
+            active_ = int((rows_['active'] == b'Y').sum())
+            print(f"{acct_:<24} alive: {header_['alive']!s:<5} rows: {header_['rows']:>4} active: {active_:>4} "
+                  f"realized: {header_['realized']:>10.2f} unrealized: {header_['unrealized']:>10.2f} "
+                  f"tripped: {bool(header_['tripped'])}")
+        time.sleep(1)
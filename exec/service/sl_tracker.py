@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+MODIFY_TIMEOUT = 5.0
+PRICE_TOLERANCE = 0.001
+
+ACCEPTED = 'ACCEPTED'
+REJECTED = 'REJECTED'
+UNKNOWN = 'UNKNOWN'
+
+
+class SlModifyTracker:
+    """
+    Tracks the outstanding SL modify requests & decides acceptance / rejection from the order update stream.
+    The broker order history (api.is_sl_update_rejected) is only consulted when the stream is ambiguous
+    or no update arrives within the timeout. Once started, such fallback checks run in the background.
+    """
+
+    def __init__(self, api, on_rejected: Callable, timeout: float = MODIFY_TIMEOUT):
+        self.api = api
+        self.on_rejected = on_rejected
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.executor = None
+        self.stats = {'requested': 0, 'accepted': 0, 'rejected': 0, 'fallback': 0, 'timeout': 0}
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SlModifyTracker")
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        logger.info(f"SlModifyTracker: Stats {self.stats}")
+
+    def request(self, order_id, idx, trigger_price):
+        """
+        Records a modify request sent to the broker
+        """
+        with self.lock:
+            self.requests[str(order_id)] = (idx, float(trigger_price), time.time())
+            self.stats['requested'] += 1
+
+    @staticmethod
+    def classify(message: dict, requested_trigger: float = None):
+        if message.get('rejreason') or 'Reject' in str(message.get('reporttype', '')):
+            return REJECTED
+        if requested_trigger is None:
+            return UNKNOWN
+        trigger = message.get('trgprc')
+        if trigger is not None and abs(float(trigger) - requested_trigger) < PRICE_TOLERANCE:
+            return ACCEPTED
+        return UNKNOWN
+
+    def on_update(self, idx, message: dict):
+        """
+        To be called for every SL leg TRIGGER_PENDING update
+        Returns: ACCEPTED, REJECTED or UNKNOWN (i.e. verification via order history was scheduled)
+        """
+        order_id = str(message['norenordno'])
+        with self.lock:
+            request = self.requests.pop(order_id, None)
+        requested_trigger = None if request is None else request[1]
+        result = self.classify(message, requested_trigger)
+        if result == ACCEPTED:
+            self.stats['accepted'] += 1
+        elif result == REJECTED:
+            self.stats['rejected'] += 1
+            self.on_rejected(idx, order_id, message.get('rejreason'))
+        else:
+            self.__verify(idx, order_id)
+        logger.debug(f"SlModifyTracker: SL modify for {order_id} is {result}")
+        return result
+
+    def check_timeouts(self):
+        """
+        Verifies via order history the requests which haven't seen an update within the timeout
+        """
+        now = time.time()
+        with self.lock:
+            expired = [(order_id, request) for order_id, request in self.requests.items()
+                       if now - request[2] > self.timeout]
+            for order_id, _ in expired:
+                del self.requests[order_id]
+        for order_id, (idx, _, _) in expired:
+            self.stats['timeout'] += 1
+            self.__verify(idx, order_id)
+
+    def __check_order_hist(self, idx, order_id):
+        try:
+            rejected, reason = self.api.is_sl_update_rejected(order_id)
+        except Exception as ex:
+            logger.exception(f"SlModifyTracker: Unable to check order history for {order_id}: {ex}")
+            return
+        if rejected:
+            self.stats['rejected'] += 1
+            self.on_rejected(idx, order_id, reason)
+
+    def __verify(self, idx, order_id):
+        self.stats['fallback'] += 1
+        if self.executor is None:
+            self.__check_order_hist(idx, order_id)
+        else:
+            self.executor.submit(self.__check_order_hist, idx, order_id)
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_PARALLEL = 4
+CONFIRM_DEADLINE = 30.0
+MAX_ATTEMPTS = 3
+
+
+class SquareOffExecutor:
+    """
+    Closes the open bracket orders concurrently (bounded) in order of priority
+    e.g. largest notional / unrealised loss first.
+    Closure is confirmed via the order update feed (confirm); legs still open post the deadline are retried
+    & finally escalated.
+    """
+
+    def __init__(self, api, max_parallel: int = MAX_PARALLEL, deadline: float = CONFIRM_DEADLINE,
+                 max_attempts: int = MAX_ATTEMPTS, on_escalate: Callable = None):
+        self.api = api
+        self.max_parallel = max_parallel
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.on_escalate = on_escalate
+        self.cond = threading.Condition()
+        self.open_orders = {}
+        self.attempts = {}
+
+    def __close(self, idx, order_no):
+        with self.cond:
+            self.attempts[idx] = self.attempts.get(idx, 0) + 1
+            attempt = self.attempts[idx]
+        try:
+            resp = self.api.api_close_bracket_order(order_no=order_no)
+        except Exception as ex:
+            logger.exception(f"SquareOffExecutor: Error closing {order_no}: {ex}")
+            resp = None
+        logger.debug(f"SquareOffExecutor: Closed BO: {order_no}, Attempt: {attempt}, Resp: {resp}")
+        return resp
+
+    def __fire(self, orders: list):
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="SquareOff") as executor:
+            futures = [(idx, order_no, executor.submit(self.__close, idx, order_no)) for idx, order_no in orders]
+        failed = []
+        for idx, order_no, future in futures:
+            if future.result() is None:
+                failed.append((idx, order_no))
+        return failed
+
+    def confirm(self, idx):
+        """
+        To be called from the order update path once the bracket for idx is closed
+        """
+        with self.cond:
+            if self.open_orders.pop(idx, None) is not None:
+                logger.debug(f"SquareOffExecutor: Confirmed close for {idx}")
+                self.cond.notify_all()
+
+    def __wait(self, timeout: float):
+        end = time.time() + timeout
+        with self.cond:
+            while len(self.open_orders) > 0:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return list(self.open_orders.items())
+
+    def close_all(self, orders: list):
+        """
+        Args:
+            orders: list of (idx, entry_order_id, priority) - higher priority is closed first
+
+        Returns: list of (idx, entry_order_id) still open post all attempts
+
+        """
+        orders = sorted(orders, key=lambda order: order[2], reverse=True)
+        with self.cond:
+            self.open_orders = {idx: order_no for idx, order_no, _ in orders}
+            self.attempts = {}
+        pending = [(idx, order_no) for idx, order_no, _ in orders]
+        start_time = time.time()
+        while len(pending) > 0:
+            failed = self.__fire(pending)
+            if len(failed) > 0:
+                logger.warning(f"SquareOffExecutor: Close request failed for {failed}")
+            still_open = self.__wait(self.deadline)
+            pending = [(idx, order_no) for idx, order_no in still_open if self.attempts.get(idx, 0) < self.max_attempts]
+            if len(pending) > 0:
+                logger.warning(f"SquareOffExecutor: Retrying close for {pending}")
+            elif len(still_open) > 0:
+                logger.error(f"SquareOffExecutor: Unable to confirm close for {still_open}")
+                if self.on_escalate is not None:
+                    self.on_escalate(still_open)
+                return still_open
+        logger.info(f"SquareOffExecutor: Closed {len(orders)} orders in {time.time() - start_time:.2f}s")
+        return []
@@ -0,0 +1,180 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STATUS_HOST = '127.0.0.1'
+ROW_COLS = ['scrip', 'model', 'signal', 'quantity', 'token', 'active', 'strength', 'trail_sl', 'sl_update_cnt']
+LEGS = ['entry', 'sl', 'target']
+# Upper bounds (ms) of the latency buckets; the last bucket is unbounded
+LATENCY_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+
+def __json_value(val):
+    if val is None or val is pd.NA or (isinstance(val, float) and val != val):
+        return None
+    if hasattr(val, 'item'):
+        # numpy scalars
+        return val.item()
+    return val
+
+
+def build_status(acct: str, params: pd.DataFrame, mtm: dict = None, kill_switch: dict = None, metrics: dict = None):
+    """
+    JSON ready engine status
+    Args:
+        acct: Account
+        params: Consistent params copy
+        mtm: LiveMtm snapshot
+        kill_switch: KillSwitch status
+        metrics: Component name -> stats e.g. broker limiter, quote conflator
+
+    Returns: dict with the active rows (incl. order legs & current SL), counts by active state, MTM & metrics
+
+    """
+    rows = []
+    for idx, row in params.loc[params['active'] == 'Y'].iterrows():
+        rec = {'idx': __json_value(idx)}
+        rec.update({col: __json_value(row[col]) for col in ROW_COLS if col in params.columns})
+        rec['legs'] = {leg: {'order_id': __json_value(row.get(f"{leg}_order_id")),
+                             'status': __json_value(row.get(f"{leg}_order_status")),
+                             'price': __json_value(row.get(f"{leg}_price")),
+                             'ts': __json_value(row.get(f"{leg}_ts"))}
+                       for leg in LEGS}
+        rec['sl'] = rec['legs']['sl']['price']
+        rows.append(rec)
+    counts = {str(state): int(count) for state, count in params['active'].value_counts().items() if count > 0}
+    return {'acct': acct, 'ts': time.time(), 'rows': len(params), 'active': counts, 'active_rows': rows,
+            'mtm': mtm, 'kill_switch': kill_switch, 'metrics': metrics}
+
+
+class LatencyHistogram:
+    """
+    Fixed bucket latency histogram - record is O(log buckets) & the snapshot reports the counts per bucket along
+    with bucket resolution percentiles
+    """
+
+    def __init__(self, bounds_ms: list = None):
+        self.bounds = [bound / 1000.0 for bound in (bounds_ms or LATENCY_BOUNDS_MS)]
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, secs: float):
+        pos = bisect.bisect_left(self.bounds, secs)
+        with self.lock:
+            self.counts[pos] += 1
+            self.count += 1
+            self.total += secs
+            self.max = max(self.max, secs)
+
+    def __percentile(self, counts: list, count: int, pct: float):
+        rank = pct * count
+        seen = 0
+        for pos, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[pos] * 1000.0 if pos < len(self.bounds) else None
+        return None
+
+    def snapshot(self):
+        """
+        Returns: dict of count, mean_ms, max_ms, p50_ms, p99_ms (bucket upper bounds; None if beyond the last)
+        & buckets i.e. '<=<bound>ms' -> count
+        """
+        with self.lock:
+            counts = list(self.counts)
+            count, total, max_secs = self.count, self.total, self.max
+        buckets = {f"<={bound * 1000.0:g}ms": bucket_count for bound, bucket_count in zip(self.bounds, counts)}
+        buckets[f">{self.bounds[-1] * 1000.0:g}ms"] = counts[-1]
+        if count == 0:
+            return {'count': 0, 'mean_ms': None, 'max_ms': None, 'p50_ms': None, 'p99_ms': None, 'buckets': buckets}
+        return {'count': count, 'mean_ms': total / count * 1000.0, 'max_ms': max_secs * 1000.0,
+                'p50_ms': self.__percentile(counts, count, 0.5), 'p99_ms': self.__percentile(counts, count, 0.99),
+                'buckets': buckets}
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/status'):
+            self.send_error(404)
+            return
+        # Published bytes are never mutated - only the reference is swapped
+        body = self.server.publisher.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"StatusPublisher: {self.address_string()} {format % args}")
+
+
+class StatusPublisher:
+    """
+    Read only status over local HTTP (GET /status) served from an immutable, pre-serialised JSON snapshot.
+    The hot path only flags a change (mark_changed - no lock); the snapshot is re-built off the hot path (refresh,
+    from the engine's main loop) if anything changed since the last one. Requests are served on their own threads.
+    """
+
+    def __init__(self, host: str = STATUS_HOST, port: int = 0):
+        self.host = host
+        self.port = port
+        self.version = 0
+        self.published_version = -1
+        self.body = b'{}'
+        self.server = None
+        self.thread = None
+
+    def mark_changed(self):
+        # Racy increments may be lost, but any increment is a change
+        self.version += 1
+
+    def refresh(self, build_fn: Callable, force: bool = False):
+        """
+        Re-builds & publishes the snapshot if changed
+        Returns: True if published
+        """
+        version = self.version
+        if not force and version == self.published_version:
+            return False
+        try:
+            body = json.dumps(build_fn(), default=str).encode()
+        except Exception as ex:
+            logger.exception(f"StatusPublisher: Unable to build status: {ex}")
+            return False
+        self.body = body
+        self.published_version = version
+        return True
+
+    def start(self):
+        if self.server is not None:
+            return
+        self.server = ThreadingHTTPServer((self.host, self.port), _StatusHandler)
+        self.server.daemon_threads = True
+        self.server.publisher = self
+        # Actual port if bound to an ephemeral one
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="StatusPublisher", daemon=True)
+        self.thread.start()
+        logger.info(f"StatusPublisher: Serving on http://{self.host}:{self.port}/status")
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.server = None
+        self.thread = None
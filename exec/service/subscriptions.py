@@ -0,0 +1,99 @@
+import logging
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def get_instrument(exchange, token):
+    return f"{exchange}|{token}"
+
+
+def open_position_mask(frame: pd.DataFrame):
+    """
+    Rows with an entered position which is yet to exit (neither SL-HIT nor TARGET-HIT) while active 'Y' or 'S'
+    """
+    if 'entry_order_status' not in frame.columns:
+        return pd.Series(False, index=frame.index)
+    mask = frame['active'].isin(['Y', 'S']) & (frame['entry_order_status'] == 'ENTERED')
+    if 'sl_order_status' in frame.columns:
+        mask &= frame['sl_order_status'] != 'SL-HIT'
+    if 'target_order_status' in frame.columns:
+        mask &= frame['target_order_status'] != 'TARGET-HIT'
+    return mask
+
+
+def actionable_mask(frame: pd.DataFrame):
+    return (frame['active'] == 'Y') | open_position_mask(frame)
+
+
+class SubscriptionManager:
+    """
+    Keeps the feed subscription in line with the params state i.e. a token is subscribed only while at least one
+    of its rows can still act (active 'Y') or has an open position (entered & not exited, incl. SL rejected 'S'
+    rows as the MTM & square off need its quotes). Once all the rows are done (INVALID, SL-HIT, TARGET-HIT,
+    rejected etal) the token is unsubscribed & it is re-subscribed if any of its rows become active again.
+    Shared by the quote & order update threads - the subscribed set is only changed under the lock.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.lock = threading.Lock()
+        self.subscribed = set()
+        self.enabled = False
+        self.stats = {'subscribed': 0, 'unsubscribed': 0}
+
+    @staticmethod
+    def __actionable(frame: pd.DataFrame):
+        active = frame.loc[actionable_mask(frame)]
+        return set(get_instrument(exchange, token) for exchange, token in zip(active['exchange'], active['token']))
+
+    def subscribe(self, frame: pd.DataFrame):
+        """
+        (Re)subscribes all the tokens with actionable rows e.g. on socket open / reconnect
+        """
+        instruments = self.__actionable(frame)
+        with self.lock:
+            self.subscribed = set()
+            self.enabled = True
+            self.__subscribe(instruments)
+        return list(instruments)
+
+    def __subscribe(self, instruments: set):
+        instruments = instruments - self.subscribed
+        if len(instruments) > 0:
+            self.api.api_subscribe(list(instruments))
+            self.subscribed |= instruments
+            self.stats['subscribed'] += len(instruments)
+            logger.info(f"SubscriptionManager: Subscribed instruments: {instruments}")
+
+    def __unsubscribe(self, instruments: set):
+        instruments = instruments & self.subscribed
+        if len(instruments) > 0:
+            self.api.api_unsubscribe(list(instruments))
+            self.subscribed -= instruments
+            self.stats['unsubscribed'] += len(instruments)
+            logger.info(f"SubscriptionManager: Unsubscribed instruments: {instruments}")
+
+    def update(self, frame: pd.DataFrame, token):
+        """
+        To be called post any change in the state of the rows of the token; no-op till subscribe is called
+        """
+        rows = frame.loc[frame['token'] == token]
+        if len(rows) == 0:
+            return
+        instrument = get_instrument(rows['exchange'].iloc[0], token)
+        actionable = actionable_mask(rows).any()
+        with self.lock:
+            if not self.enabled:
+                return
+            if actionable and instrument not in self.subscribed:
+                self.__subscribe({instrument})
+            elif not actionable and instrument in self.subscribed:
+                self.__unsubscribe({instrument})
+
+    def unsubscribe_all(self):
+        with self.lock:
+            self.enabled = False
+            self.__unsubscribe(set(self.subscribed))
@@ -4,6 +4,15 @@ from commons.consts.consts import TODAY
 
 logger = logging.getLogger(__name__)
 
+ENTRY_LEG = 'ENTRY_LEG'
+SL_LEG = 'SL_LEG'
+TARGET_LEG = 'TARGET_LEG'
+LEG_ORDER_ID_COLS = {
+    ENTRY_LEG: 'entry_order_id',
+    SL_LEG: 'sl_order_id',
+    TARGET_LEG: 'target_order_id'
+}
+
 
 def get_order_ref(acct, row):
     order_date = str(TODAY)
@@ -30,21 +39,80 @@ def get_order_index(message):
     return int(message.split(":")[-1])
 
 
-def get_contra_leg(params, order_id):
+class OrderIndex:
+    """
+    Order ID -> (params index, leg type) lookup maintained alongside params.
+    Every time an order id is assigned to a params row it should be added here.
+    """
+
+    def __init__(self):
+        self.orders = {}
+
+    @staticmethod
+    def order_key(order_id):
+        if isinstance(order_id, float) and order_id.is_integer():
+            return str(int(order_id))
+        return str(order_id)
+
+    def add(self, order_id, idx, leg: str):
+        if order_id is None or order_id != order_id or self.order_key(order_id) == '-1':
+            return
+        self.orders[self.order_key(order_id)] = (idx, leg)
+
+    def get(self, order_id):
+        return self.orders.get(self.order_key(order_id))
+
+    def clear(self):
+        self.orders = {}
+
+    def build(self, params):
+        """
+        (Re)builds the index from the order id columns of params e.g. post load_params
+        """
+        self.clear()
+        for leg, col in LEG_ORDER_ID_COLS.items():
+            if col not in params.columns:
+                continue
+            for idx, order_id in params[col].dropna().items():
+                self.add(order_id, idx, leg)
+        logger.debug(f"OrderIndex: Built index with {len(self.orders)} orders")
+        return self
+
+    def __contains__(self, order_id):
+        return self.order_key(order_id) in self.orders
+
+    def __len__(self):
+        return len(self.orders)
+
+
+def get_contra_leg(params, order_id, order_index: OrderIndex = None):
     """
     Get the SL leg if order_id is Target or vice-versa
     Args:
         :param order_id: Order ID for which to get contra leg (for closing it etal)
         :param params: DF containing active orders
+        :param order_index: Order ID index; if provided avoids scanning params
 
     Returns: Other leg order_id
 
     """
+    if order_index is not None:
+        entry = order_index.get(order_id)
+        if entry is None:
+            return None
+        idx, leg = entry
+        if leg == SL_LEG:
+            return idx, params.at[idx, 'entry_order_id'], params.at[idx, 'target_order_id'], 'SL-HIT'
+        elif leg == TARGET_LEG:
+            return idx, params.at[idx, 'entry_order_id'], params.at[idx, 'sl_order_id'], 'TARGET-HIT'
+        return None
+    # Compared as order keys as the id columns are Int64 post load (str / float in raw frames)
+    order_key = OrderIndex.order_key(order_id)
     # SL Leg?
-    rows = params.loc[(params.sl_order_id == order_id)]
+    rows = params.loc[params.sl_order_id.map(OrderIndex.order_key) == order_key]
     for idx, row in rows.iterrows():
         return idx, row['entry_order_id'], row['target_order_id'], 'SL-HIT'
     # Target Leg?
-    rows = params.loc[(params.target_order_id == order_id)]
+    rows = params.loc[params.target_order_id.map(OrderIndex.order_key) == order_key]
     for idx, row in rows.iterrows():
         return idx, row['entry_order_id'], row['sl_order_id'], 'TARGET-HIT'
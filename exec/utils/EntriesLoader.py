@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLS = ['scrip', 'model', 'exchange', 'symbol', 'type']
+ENTRIES_SCHEMA = {
+    'close': 'float64',
+    'signal': 'int64',
+    'target': 'float64',
+    'scrip': 'category',
+    'model': 'category',
+    'exchange': 'category',
+    'symbol': 'category',
+    'token': 'str',
+    'target_pct': 'float64',
+    'sl_pct': 'float64',
+    'trail_sl_pct': 'float64',
+    'tick': 'float64',
+    'type': 'category',
+    'quantity': 'int64'
+}
+CACHE_DIR = '.entries-cache'
+META_FILE = 'meta.json'
+
+
+def to_plain_dtypes(df: pd.DataFrame):
+    """
+    Categorical columns as object e.g. prior to fillna / DB writes which need arbitrary values
+    """
+    cols = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if len(cols) == 0:
+        return df
+    return df.astype({col: object for col in cols})
+
+
+def __cache_path(csv_path: str, digest: str):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(csv_path), CACHE_DIR, f"{name}-{digest[:16]}")
+
+
+def __remove_stale(cache_path: str):
+    """
+    Removes the cache entries of the same CSV for other (older) content i.e. only the current one is kept
+    """
+    cache_dir, current = os.path.split(cache_path)
+    pattern = re.compile(re.escape(current[:-16]) + r'[0-9a-f]{16}')
+    for entry in os.listdir(cache_dir):
+        if entry != current and pattern.fullmatch(entry):
+            logger.debug(f"read_entries: Removing stale cache {entry}")
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+
+
+def __write_cache(path: str, df: pd.DataFrame):
+    """
+    One .npy per column - categorical & object columns as int codes with the categories in the meta
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    cols = []
+    for pos, col in enumerate(df.columns):
+        series = df[col]
+        meta = {'name': col, 'file': f"{pos}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+            categorical = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+            meta['kind'] = 'category' if isinstance(series.dtype, pd.CategoricalDtype) else 'object'
+            meta['categories'] = categorical.cat.categories.tolist()
+            values = categorical.cat.codes.to_numpy()
+        else:
+            meta['kind'] = 'numeric'
+            values = series.to_numpy()
+        np.save(os.path.join(tmp_path, meta['file']), values, allow_pickle=False)
+        cols.append(meta)
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        # Default range index is rebuilt on read
+        index = None if df.index.equals(pd.RangeIndex(len(df))) else df.index.tolist()
+        json.dump({'cols': cols, 'rows': len(df), 'index': index}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Written by a concurrent process
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def __read_cache(path: str):
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        meta = json.load(f)
+    data = {}
+    for col in meta['cols']:
+        values = np.load(os.path.join(path, col['file']), mmap_mode='r', allow_pickle=False)
+        if col['kind'] == 'numeric':
+            data[col['name']] = values
+        else:
+            categorical = pd.Categorical.from_codes(values, categories=col['categories'])
+            data[col['name']] = categorical if col['kind'] == 'category' else np.asarray(categorical, dtype=object)
+    index = pd.RangeIndex(meta['rows']) if meta['index'] is None else meta['index']
+    return pd.DataFrame(data, index=index)
+
+
+def read_entries(csv_path: str, use_cache: bool = True):
+    """
+    Typed read of an <acct>-Entries.csv as per ENTRIES_SCHEMA (other columns are inferred).
+    The typed frame is cached as memory mapped column files next to the CSV, keyed by the CSV content hash i.e.
+    a restart / COB setup on the same file skips the CSV parsing. Only the cache of the current content is kept.
+    Args:
+        csv_path: Entries CSV
+        use_cache: Read & write the cache
+
+    Returns: Entries DataFrame
+
+    """
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    cache_path = __cache_path(csv_path, digest)
+    if use_cache and os.path.exists(os.path.join(cache_path, META_FILE)):
+        try:
+            return __read_cache(cache_path)
+        except Exception as ex:
+            logger.warning(f"read_entries: Ignoring unreadable cache {cache_path}: {ex}")
+
+    entries = pd.read_csv(csv_path, dtype=ENTRIES_SCHEMA)
+    if use_cache:
+        try:
+            __write_cache(cache_path, entries)
+            __remove_stale(cache_path)
+        except OSError as ex:
+            logger.warning(f"read_entries: Unable to write cache {cache_path}: {ex}")
+    return entries
@@ -1,5 +1,7 @@
 import logging
 import os
+from functools import partial
+from typing import Callable, NamedTuple
 
 import numpy as np
 import pandas as pd
@@ -9,6 +11,9 @@ from commons.consts.consts import S_TODAY, PARAMS_LOG_TYPE, PARAMS_HIST
 from commons.service.LogService import LogService
 from commons.service.RiskCalc import RiskCalc
 
+from exec.utils.EntriesLoader import read_entries, to_plain_dtypes
+from exec.utils.ParamsSchema import enforce_params_schema
+
 logger = logging.getLogger(__name__)
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
@@ -23,6 +28,70 @@ ORDER_COLS = ['entry_order_id', 'sl_order_id', 'target_order_id',
               'active']
 
 
+class OrderTemplate(NamedTuple):
+    """
+    Immutable, pre-computed part of the entry order for a params row.
+    Only the LTP dependent fields (risk ranges & BOD SL) are filled in on the tick path.
+    """
+    idx: int
+    direction: str
+    signal: int
+    remarks: str
+    exchange: str
+    symbol: str
+    quantity: int
+    risk_params: Callable
+
+
+def get_entries_path(acct: str):
+    return os.path.join(cfg['generated'], 'summary', acct + '-Entries.csv')
+
+
+def build_order_template(idx, row, acct: str, rc: RiskCalc) -> OrderTemplate:
+    """
+    Builds the order template for a single params row
+    Args:
+        idx: Params index - used as the order number in remarks
+        row: Params row
+        acct: Account
+        rc: Risk Calc - the row static arguments are bound, leaving only the entry (LTP)
+
+    Returns: OrderTemplate
+
+    """
+    return OrderTemplate(idx=idx,
+                         direction='B' if row.signal == 1 else 'S',
+                         signal=row.signal,
+                         remarks=":".join(["BO", row.model, row.scrip, str(idx)]),
+                         exchange=row.exchange,
+                         symbol=row.symbol,
+                         quantity=row.quantity,
+                         risk_params=partial(rc.calc_risk_params, scrip=row.scrip, strategy=row.model,
+                                             signal=row.signal, tick=row.tick, acct=acct,
+                                             prev_close=row.close, pred_target=row.target)
+                         )
+
+
+def build_order_templates(params: pd.DataFrame, acct: str, rc: RiskCalc = None) -> dict:
+    """
+    Pre-compiles the order templates for all rows which are yet to enter i.e. no entry order
+    Args:
+        params: Params as returned by load_params
+        acct: Account
+        rc: Risk Calc
+
+    Returns: dict of params index -> OrderTemplate
+
+    """
+    if rc is None:
+        rc = RiskCalc()
+    templates = {}
+    for idx, row in params.loc[pd.isnull(params.entry_order_id)].iterrows():
+        templates[idx] = build_order_template(idx, row, acct, rc)
+    logger.debug(f"build_order_templates: Built {len(templates)} order templates")
+    return templates
+
+
 def __extract_order_book_params(api: Shoonya, df: pd.DataFrame):
     if len(df) == 0:
         return pd.DataFrame()
@@ -77,19 +146,20 @@ def __extract_order_book_params(api: Shoonya, df: pd.DataFrame):
         pd.DataFrame()
 
 
-def load_params(api: Shoonya, acct: str, log_service: LogService = None, rc: RiskCalc = None):
+def load_params(api: Shoonya, acct: str, log_service: LogService = None, rc: RiskCalc = None, log_acct: str = None):
     """
     1. Reads Entries file
     2. Gets Order Book
     3. Overlays order type
     4. Join Order book with Entries
     5. Populate Global Params
+    :param log_acct: Account the BOD params are logged under e.g. the paper account; defaults to acct
     :return:
     """
     if rc is None:
         rc = RiskCalc()
     # Get list of scrips params
-    params = pd.read_csv(os.path.join(cfg['generated'], 'summary', acct + '-Entries.csv'))
+    params = read_entries(get_entries_path(acct))
 
     str_cols = [
         'entry_order_id', 'sl_order_id', 'target_order_id',
@@ -106,7 +176,6 @@ def load_params(api: Shoonya, acct: str, log_service: LogService = None, rc: Ris
 
     params['active'] = 'Y'
     params['sl_update_cnt'] = 0
-    params['token'] = params['token'].astype(str)
     ob = api.api_get_order_book()
     if ob is None:
         orders = []
@@ -139,20 +208,25 @@ def load_params(api: Shoonya, acct: str, log_service: LogService = None, rc: Ris
     else:
         logger.info("__load_params: No orders to stitch to params.")
 
+    params = enforce_params_schema(params)
     if log_service is not None:
-        log_service.log_entry(log_type=PARAMS_LOG_TYPE, keys=["BOD"], data=params, acct=acct, log_date=S_TODAY)
+        log_service.log_entry(log_type=PARAMS_LOG_TYPE, keys=["BOD"], data=params,
+                              acct=acct if log_acct is None else log_acct, log_date=S_TODAY)
     logger.info(f"__load_params: Params:\n{params}")
     return params
 
 
 def store_param_hist(trader_db, acct, cob_date, params):
-    db_params = params.fillna(0)
+    """
+    Re-writes the params hist for the acct & cob date in a single transaction
+    Args:
+        trader_db: exec.service.db.TraderDb
+    """
+    db_params = to_plain_dtypes(params).fillna(0)
     db_params = db_params.assign(acct=acct, trade_date=cob_date)
-    predicate = f"m.{PARAMS_HIST}.acct == '{acct}'"
-    predicate += f",m.{PARAMS_HIST}.trade_date == '{cob_date}'"
-    trader_db.delete_recs(PARAMS_HIST, predicate=predicate)
     logger.debug(f"About to store:\n{db_params}")
-    trader_db.bulk_insert(PARAMS_HIST, data=db_params)
+    with trader_db.unit_of_work() as uow:
+        uow.replace_recs(PARAMS_HIST, data=db_params, acct=acct, trade_date=cob_date)
     logger.info(f"store_params: Orders created for {acct}")
 
 
@@ -0,0 +1,107 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from exec.utils.EntriesLoader import CATEGORICAL_COLS
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUSES = ['ENTERED', 'REJECTED', 'INVALID', 'OPEN', 'TRIGGER_PENDING', 'SL-HIT', 'TARGET-HIT', 'CANCELED',
+                  'COMPLETE', 'PENDING']
+ACTIVE_STATES = ['Y', 'N', 'S']
+
+ORDER_ID_COLS = ['entry_order_id', 'sl_order_id', 'target_order_id']
+STATUS_COLS = ['entry_order_status', 'sl_order_status', 'target_order_status']
+TS_COLS = ['entry_ts', 'sl_ts', 'target_ts']
+PRICE_COLS = ['entry_price', 'sl_price', 'target_price', 'strength', 'target_range', 'sl_range', 'trail_sl',
+              'bod_sl']
+
+# Nullable Int64 for ids & epochs (missing till the order is placed / updated); prices stay float64 for the tick
+# arithmetic
+PARAMS_SCHEMA = {
+    **{col: 'category' for col in CATEGORICAL_COLS},
+    **{col: 'Int64' for col in ORDER_ID_COLS + TS_COLS},
+    **{col: pd.CategoricalDtype(ORDER_STATUSES) for col in STATUS_COLS},
+    **{col: 'float64' for col in PRICE_COLS},
+    'active': pd.CategoricalDtype(ACTIVE_STATES),
+    'sl_update_cnt': 'int64'
+}
+
+
+def __to_int(val):
+    if val is None or val is pd.NA or val == '':
+        return pd.NA
+    if isinstance(val, float):
+        return pd.NA if np.isnan(val) else int(val)
+    if isinstance(val, str) and not val.lstrip('-').isdigit():
+        # e.g. epoch as "1700814305.0"
+        return int(float(val))
+    return int(val)
+
+
+def __categories(series: pd.Series, dtype):
+    """
+    Fixed categories (if any) plus whatever else is present e.g. a broker status not known upfront
+    """
+    known = [] if isinstance(dtype, str) else list(dtype.categories)
+    present = series.dropna().unique().tolist()
+    return pd.CategoricalDtype(known + [val for val in present if val not in known])
+
+
+def enforce_params_schema(params: pd.DataFrame):
+    """
+    Casts the params columns (those present) to PARAMS_SCHEMA
+    Args:
+        params: Params frame
+
+    Returns: Params frame with the compact dtypes
+
+    """
+    params = params.copy()
+    for col, dtype in PARAMS_SCHEMA.items():
+        if col not in params.columns:
+            continue
+        series = params[col]
+        if dtype == 'category' or isinstance(dtype, pd.CategoricalDtype):
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(object)
+            params[col] = series.astype(__categories(series, dtype))
+        elif dtype == 'Int64':
+            params[col] = pd.array([__to_int(val) for val in series], dtype='Int64')
+        else:
+            params[col] = series.astype(dtype)
+    return params
+
+
+def coerce_value(frame: pd.DataFrame, col: str, val):
+    """
+    Value in the column's dtype; unseen categories are added to the column
+    """
+    dtype = PARAMS_SCHEMA.get(col)
+    if dtype is None or col not in frame.columns:
+        return val
+    if dtype == 'Int64':
+        return __to_int(val)
+    if dtype in ('float64', 'int64'):
+        return val if val is None else np.dtype(dtype).type(val)
+    col_dtype = frame[col].dtype
+    if isinstance(col_dtype, pd.CategoricalDtype) and val is not None and val == val and \
+            val not in col_dtype.categories:
+        frame[col] = frame[col].cat.add_categories([val])
+    return val
+
+
+def set_values(frame: pd.DataFrame, idx, cols: list, values):
+    """
+    Schema preserving row write i.e. frame.loc[idx, cols] = values
+    """
+    for col, val in zip(cols, values):
+        frame.loc[idx, col] = coerce_value(frame, col, val)
+
+
+def to_order_id(order_id):
+    """
+    Broker order id (str) as stored in params
+    """
+    return __to_int(order_id)
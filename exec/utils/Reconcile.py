@@ -0,0 +1,73 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RECON_KEYS = ['acct', 'trade_date', 'scrip', 'model']
+TRADE_COLS = ['signal', 'quantity', 'entry_time', 'entry_price', 'exit_time', 'exit_price', 'pnl']
+MATCHED = 'MATCHED'
+MISSED = 'MISSED'
+EXTRA = 'EXTRA'
+
+
+def __trade_cols(trades: pd.DataFrame, suffix: str):
+    trades = trades.reindex(columns=RECON_KEYS + TRADE_COLS)
+    trades[TRADE_COLS] = trades[TRADE_COLS].apply(pd.to_numeric, errors='coerce')
+    return trades.rename(columns={col: f"{col}_{suffix}" for col in TRADE_COLS})
+
+
+def entered_trades(trades: pd.DataFrame):
+    """
+    Rows which were actually entered - the BROKER trade log has every params row with the un-entered ones zero filled
+    """
+    entry_price = pd.to_numeric(trades['entry_price'], errors='coerce').fillna(0)
+    entry_time = pd.to_numeric(trades['entry_time'], errors='coerce').fillna(0)
+    return trades.loc[(entry_price > 0) & (entry_time > 0)]
+
+
+def reconcile_trades(broker_trades: pd.DataFrame, bt_trades: pd.DataFrame):
+    """
+    Broker vs backtest trades joined on (acct, trade_date, scrip, model).
+    Slippages are per share & signed such that positive is a cost to the broker trade.
+    Args:
+        broker_trades: TRADE_LOG BROKER rows (un-entered rows are dropped i.e. MISSED if the backtest traded)
+        bt_trades: TRADE_LOG BACKTEST rows
+
+    Returns: Recon frame - one row per key with status MATCHED, MISSED (backtest only) or EXTRA (broker only),
+        entry_slippage, exit_slippage, fill_latency (secs from the backtest entry tick) & pnl_gap
+
+    """
+    recon = pd.merge(__trade_cols(entered_trades(broker_trades), 'broker'), __trade_cols(bt_trades, 'bt'),
+                     how='outer', on=RECON_KEYS, indicator=True)
+    recon['status'] = np.select([recon['_merge'] == 'both', recon['_merge'] == 'right_only'], [MATCHED, MISSED],
+                                default=EXTRA)
+    signal = recon['signal_broker'].fillna(recon['signal_bt'])
+    quantity = recon['quantity_broker'].fillna(recon['quantity_bt'])
+    recon['entry_slippage'] = signal * (recon['entry_price_broker'] - recon['entry_price_bt'])
+    recon['exit_slippage'] = signal * (recon['exit_price_bt'] - recon['exit_price_broker'])
+    recon['slippage_cost'] = (recon['entry_slippage'] + recon['exit_slippage']) * quantity
+    recon['fill_latency'] = recon['entry_time_broker'] - recon['entry_time_bt']
+    recon['pnl_gap'] = recon['pnl_broker'].fillna(0) - recon['pnl_bt'].fillna(0)
+    recon = recon[RECON_KEYS + ['status', 'entry_slippage', 'exit_slippage', 'slippage_cost', 'fill_latency',
+                                'pnl_broker', 'pnl_bt', 'pnl_gap']]
+    float_cols = ['entry_slippage', 'exit_slippage', 'slippage_cost', 'fill_latency', 'pnl_broker', 'pnl_bt',
+                  'pnl_gap']
+    recon[float_cols] = recon[float_cols].astype('float32')
+    recon['status'] = recon['status'].astype('category')
+    return recon
+
+
+def summarise_recon(recon: pd.DataFrame):
+    """
+    Per acct / day totals of a recon frame
+    """
+    matched = recon.loc[recon['status'] == MATCHED]
+    return {'trades': len(recon),
+            'matched': len(matched),
+            'missed': int((recon['status'] == MISSED).sum()),
+            'extra': int((recon['status'] == EXTRA).sum()),
+            'slippage_cost': float(matched['slippage_cost'].sum()),
+            'avg_fill_latency': float(matched['fill_latency'].mean()) if len(matched) > 0 else None,
+            'pnl_gap': float(recon['pnl_gap'].sum())}
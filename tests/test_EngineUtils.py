@@ -0,0 +1,36 @@
+import unittest
+
+import pandas as pd
+
+from exec.utils.EngineUtils import OrderIndex, get_contra_leg, SL_LEG, TARGET_LEG, ENTRY_LEG
+
+
+class TestEngineUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.params = pd.DataFrame({
+            'entry_order_id': ['23112400485194', -1, None],
+            'sl_order_id': ['23112400485195', None, None],
+            'target_order_id': ['23112400485196', None, None]
+        })
+
+    def test_order_index(self):
+        order_index = OrderIndex().build(self.params)
+
+        self.assertEqual(len(order_index), 3)
+        self.assertEqual(order_index.get('23112400485194'), (0, ENTRY_LEG))
+        self.assertEqual(order_index.get(23112400485195.0), (0, SL_LEG))
+        self.assertIsNone(order_index.get(-1))
+
+        order_index.add('23112400485197', 1, ENTRY_LEG)
+        self.assertIn('23112400485197', order_index)
+
+    def test_get_contra_leg(self):
+        order_index = OrderIndex().build(self.params)
+        for index in [None, order_index]:
+            self.assertEqual(get_contra_leg(self.params, '23112400485195', index),
+                             (0, '23112400485194', '23112400485196', 'SL-HIT'))
+            self.assertEqual(get_contra_leg(self.params, '23112400485196', index),
+                             (0, '23112400485194', '23112400485195', 'TARGET-HIT'))
+            self.assertIsNone(get_contra_leg(self.params, '99', index))
+        self.assertEqual(order_index.get('23112400485196'), (0, TARGET_LEG))
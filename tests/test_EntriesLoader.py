@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from tests.Utils import TEST_RESOURCE_DIR
+
+from exec.utils.EntriesLoader import read_entries, to_plain_dtypes, CATEGORICAL_COLS, CACHE_DIR
+
+
+class TestEntriesLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.dir.name, 'Trader-V2-Pralhad-Entries.csv')
+        shutil.copy(os.path.join(TEST_RESOURCE_DIR, 'create_bo/summary/Trader-V2-Pralhad-Entries.csv'), self.csv_path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_schema(self):
+        entries = read_entries(self.csv_path, use_cache=False)
+        for col in CATEGORICAL_COLS:
+            self.assertIsInstance(entries[col].dtype, pd.CategoricalDtype)
+        self.assertEqual(entries['token'].tolist()[0], '2263')
+        self.assertEqual(entries['quantity'].dtype, np.int64)
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, CACHE_DIR)))
+
+    def test_cache(self):
+        entries = read_entries(self.csv_path)
+        self.assertEqual(len(os.listdir(os.path.join(self.dir.name, CACHE_DIR))), 1)
+        with patch('exec.utils.EntriesLoader.pd.read_csv') as read_csv:
+            cached = read_entries(self.csv_path)
+            read_csv.assert_not_called()
+        pd.testing.assert_frame_equal(cached, entries)
+
+        # Changed CSV - new cache entry replaces the stale one, other CSVs' entries are kept
+        other_path = os.path.join(self.dir.name, 'Trader-V2-Mahi-Entries.csv')
+        shutil.copy(self.csv_path, other_path)
+        read_entries(other_path)
+        with open(self.csv_path, 'a') as f:
+            f.write("100.0,1,101.0,NSE_X,trainer.strategies.gspcV2,NSE,X-EQ,1,,1.0,0.1,0.05,Fixed,0,1\n")
+        self.assertEqual(len(read_entries(self.csv_path)), len(entries) + 1)
+        cached = sorted(os.listdir(os.path.join(self.dir.name, CACHE_DIR)))
+        self.assertEqual(len(cached), 2)
+        self.assertEqual([entry[:-17] for entry in cached], ['Trader-V2-Mahi-Entries', 'Trader-V2-Pralhad-Entries'])
+
+    def test_plain_dtypes(self):
+        entries = to_plain_dtypes(read_entries(self.csv_path, use_cache=False))
+        self.assertEqual(entries['scrip'].dtype, object)
+        self.assertEqual(len(entries.fillna(0)), len(entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
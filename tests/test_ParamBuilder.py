@@ -1,7 +1,7 @@
 import json
 import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, Mock
 
 import numpy as np
 import pandas as pd
@@ -21,7 +21,8 @@ TEST_RESOURCE_DIR = os.path.join(REPO_DIR, "resources/test")
 
 from commons.broker.Shoonya import Shoonya
 
-from exec.utils.ParamBuilder import load_params
+from exec.utils.ParamBuilder import load_params, build_order_templates
+from exec.utils.ParamsSchema import enforce_params_schema
 
 
 def read_file(name, ret_type: str = "JSON"):
@@ -57,5 +58,29 @@ class TestEngine(unittest.TestCase):
         params = load_params(api=Shoonya(acct=ACCT), acct=ACCT)
         result = read_file_df("load_params/expected-params.json")
         result['target_pct'] = np.NaN
+        result = enforce_params_schema(result)
 
         pd.testing.assert_frame_equal(params, result)
+
+    @patch.dict('exec.utils.ParamBuilder.cfg', {"generated": os.path.join(TEST_RESOURCE_DIR, 'create_bo')})
+    @patch('exec.utils.ParamBuilder.Shoonya.api_get_order_book')
+    def test_build_order_templates(self, mock_api):
+        mock_api.return_value = None
+        rc = Mock()
+        rc.calc_risk_params.return_value = ("1.00", "1.00", "0.50")
+
+        params = load_params(api=Shoonya(acct=ACCT), acct=ACCT)
+        templates = build_order_templates(params=params, acct=ACCT, rc=rc)
+
+        self.assertEqual(len(templates), len(params))
+        template = templates[5]
+        self.assertEqual(template.direction, 'B')
+        self.assertEqual(template.remarks, "BO:trainer.strategies.rfcV2:NSE_ONGC:5")
+        self.assertEqual(template.symbol, "ONGC-EQ")
+        self.assertEqual(template.quantity, 71)
+        self.assertEqual(templates[0].direction, 'S')
+
+        self.assertEqual(template.risk_params(entry=191.0), ("1.00", "1.00", "0.50"))
+        rc.calc_risk_params.assert_called_with(scrip="NSE_ONGC", strategy="trainer.strategies.rfcV2", signal=1,
+                                               tick=0.05, acct=ACCT, prev_close=188.85, pred_target=192.0,
+                                               entry=191.0)
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from exec.utils.ParamsSchema import enforce_params_schema, set_values, to_order_id
+
+
+class TestParamsSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.params = enforce_params_schema(pd.DataFrame({
+            'scrip': ['NSE_ONGC', 'NSE_BPCL'],
+            'token': ['2475', '526'],
+            'entry_order_id': ['23112400485194', None],
+            'entry_order_status': ['ENTERED', None],
+            'entry_ts': ['1700814305', np.NaN],
+            'entry_price': ['213.85', None],
+            'active': ['Y', 'Y'],
+            'sl_update_cnt': [0, 0]
+        }))
+
+    def test_enforce(self):
+        dtypes = self.params.dtypes
+        self.assertIsInstance(dtypes['scrip'], pd.CategoricalDtype)
+        self.assertIsInstance(dtypes['entry_order_status'], pd.CategoricalDtype)
+        self.assertIsInstance(dtypes['active'], pd.CategoricalDtype)
+        self.assertEqual(dtypes['entry_order_id'], 'Int64')
+        self.assertEqual(dtypes['entry_ts'], 'Int64')
+        self.assertEqual(dtypes['entry_price'], np.float64)
+        self.assertEqual(dtypes['token'], object)
+        self.assertEqual(self.params.at[0, 'entry_order_id'], 23112400485194)
+        self.assertTrue(pd.isnull(self.params.at[1, 'entry_order_id']))
+        # Idempotent
+        pd.testing.assert_frame_equal(enforce_params_schema(self.params), self.params)
+
+    def test_set_values(self):
+        dtypes = self.params.dtypes.astype(str)
+        set_values(self.params, 1, ['entry_order_id', 'entry_order_status', 'entry_ts', 'entry_price'],
+                   ('23112400485197', 'NEW-STATUS', 1700814306, 101.5))
+        self.params.loc[1, 'active'] = 'S'
+        pd.testing.assert_series_equal(self.params.dtypes.astype(str), dtypes)
+        self.assertEqual(self.params.at[1, 'entry_order_status'], 'NEW-STATUS')
+        self.assertEqual(self.params.at[1, 'entry_order_id'], to_order_id('23112400485197'))
+        self.assertEqual(len(self.params.loc[pd.isnull(self.params.entry_order_id)]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
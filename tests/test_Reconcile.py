@@ -0,0 +1,54 @@
+import unittest
+
+import pandas as pd
+
+from exec.utils.Reconcile import reconcile_trades, summarise_recon, MATCHED, MISSED, EXTRA
+
+
+class TestReconcile(unittest.TestCase):
+
+    def test_reconcile(self):
+        keys = {'acct': 'Trader-V2-Pralhad', 'trade_date': '2024-01-01'}
+        broker = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'model': ['rfcV2', 'rfcV2'], 'signal': [1, -1],
+                               'quantity': [10, 5], 'entry_time': [1000, 2000], 'entry_price': [100.2, 49.9],
+                               'exit_time': [5000, 6000], 'exit_price': [101.0, 49.0], 'pnl': [8.0, 4.5],
+                               'trade_type': 'BROKER', **keys})
+        bt = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_WIPRO'], 'model': ['rfcV2', 'rfcV2'], 'signal': [1, 1],
+                           'quantity': [10, 1], 'entry_time': [998, 1000], 'entry_price': [100.0, 400.0],
+                           'exit_time': [5000, 5000], 'exit_price': [101.1, 401.0], 'pnl': [11.0, 1.0],
+                           'trade_type': 'BACKTEST', **keys})
+        recon = reconcile_trades(broker, bt).set_index('scrip')
+
+        self.assertEqual(recon.loc['NSE_ONGC', 'status'], MATCHED)
+        self.assertEqual(recon.loc['NSE_WIPRO', 'status'], MISSED)
+        self.assertEqual(recon.loc['NSE_BPCL', 'status'], EXTRA)
+        self.assertAlmostEqual(recon.loc['NSE_ONGC', 'entry_slippage'], 0.2, places=4)
+        self.assertAlmostEqual(recon.loc['NSE_ONGC', 'exit_slippage'], 0.1, places=4)
+        self.assertAlmostEqual(recon.loc['NSE_ONGC', 'slippage_cost'], 3.0, places=3)
+        self.assertEqual(recon.loc['NSE_ONGC', 'fill_latency'], 2)
+        self.assertEqual(recon.loc['NSE_ONGC', 'pnl_gap'], -3.0)
+        self.assertEqual(recon.loc['NSE_WIPRO', 'pnl_gap'], -1.0)
+
+        summary = summarise_recon(recon.reset_index())
+        self.assertEqual((summary['matched'], summary['missed'], summary['extra']), (1, 1, 1))
+        self.assertAlmostEqual(summary['pnl_gap'], 0.5)
+
+    def test_un_entered_broker_row(self):
+        keys = {'acct': 'Trader-V2-Pralhad', 'trade_date': '2024-01-01', 'model': 'rfcV2'}
+        # Params row with no entry - zero filled in the trade log
+        broker = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'signal': [1, 1], 'quantity': [10, 5],
+                               'entry_time': [0, 2000], 'entry_price': [0.0, 50.0], 'exit_time': [0, 6000],
+                               'exit_price': [0.0, 51.0], 'pnl': [0.0, 5.0], 'trade_type': 'BROKER', **keys})
+        bt = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'signal': [1, 1], 'quantity': [10, 5],
+                           'entry_time': [998, 2000], 'entry_price': [100.0, 50.0], 'exit_time': [5000, 6000],
+                           'exit_price': [101.0, 51.0], 'pnl': [10.0, 5.0], 'trade_type': 'BACKTEST', **keys})
+        recon = reconcile_trades(broker, bt).set_index('scrip')
+        self.assertEqual(recon.loc['NSE_ONGC', 'status'], MISSED)
+        self.assertTrue(pd.isna(recon.loc['NSE_ONGC', 'entry_slippage']))
+        self.assertEqual(recon.loc['NSE_ONGC', 'pnl_gap'], -10.0)
+        self.assertEqual(recon.loc['NSE_BPCL', 'status'], MATCHED)
+        self.assertEqual(summarise_recon(recon.reset_index())['missed'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
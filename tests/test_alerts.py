@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest
+
+from exec.service.alerts import AlertDispatcher
+
+
+class TestAlertDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    def send(self, body, subject):
+        self.sent.append((subject, body))
+        self.event.set()
+
+    def test_sync_till_started(self):
+        alerts = AlertDispatcher(send=self.send)
+        alerts.alert(subject="Websocket Error! - A", body="Error 1", acct="A")
+        self.assertEqual(self.sent, [("Websocket Error! - A", "Error 1")])
+
+    def test_dedup_digest(self):
+        alerts = AlertDispatcher(send=self.send, window=60)
+        alerts.start()
+        alerts.alert(subject="Websocket Error! - A", body="Error 1", acct="A")
+        self.assertTrue(self.event.wait(5))
+        for _ in range(3):
+            alerts.alert(subject="Websocket Error! - A", body="Error 2", acct="A")
+        alerts.alert(subject="Websocket Error! - B", body="Error 1", acct="B")
+        time.sleep(0.1)
+        self.assertEqual(len(self.sent), 2)
+        alerts.stop()
+        self.assertEqual(len(self.sent), 3)
+        subject, body = self.sent[-1]
+        self.assertEqual(subject, "Websocket Error! - A (3 repeats)")
+        self.assertIn("Error 2 (x3)", body)
+        self.assertEqual(alerts.stats['suppressed'], 3)
+
+    def test_digest_post_window(self):
+        alerts = AlertDispatcher(send=self.send, window=0.2)
+        alerts.start()
+        alerts.alert(subject="S", body="1")
+        alerts.alert(subject="S", body="2")
+        deadline = time.time() + 5
+        while len(self.sent) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        alerts.stop()
+        self.assertEqual([subject for subject, _ in self.sent], ["S", "S (1 repeats)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
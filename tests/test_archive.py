@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+
+import pandas as pd
+
+from exec.service.archive import TradeArchive, TRADES_DATASET, PARAMS_DATASET
+
+
+class TestTradeArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive = TradeArchive(path=self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def __trades(self, pnl):
+        return pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'model': ['trainer.strategies.rfcV2'] * 2,
+                             'status': ['SL-HIT', 0], 'pnl': pnl, 'acct': 'A', 'trade_date': '2024-01-01'})
+
+    def test_write_read(self):
+        self.archive.write(TRADES_DATASET, self.__trades([1.0, 2.0]), trade_date='2024-01-01', acct='A',
+                           trade_type='BROKER')
+        self.archive.write(TRADES_DATASET, self.__trades([3.0, 4.0]), trade_date='2024-01-02', acct='A',
+                           trade_type='BACKTEST')
+        self.archive.write(TRADES_DATASET, self.__trades([5.0, 6.0]), trade_date='2024-01-02', acct='B',
+                           trade_type='BROKER')
+        # Re-run replaces the partition
+        self.archive.write(TRADES_DATASET, self.__trades([7.0, 8.0]), trade_date='2024-01-01', acct='A',
+                           trade_type='BROKER')
+
+        trades = self.archive.read(TRADES_DATASET, columns=['trade_date', 'scrip', 'pnl'],
+                                   filters=[('acct', '=', 'A'), ('trade_type', '=', 'BROKER')])
+        self.assertEqual(list(trades.columns), ['trade_date', 'scrip', 'pnl'])
+        self.assertEqual(trades['pnl'].tolist(), [7.0, 8.0])
+
+        trades = self.archive.read(TRADES_DATASET, filters=[('trade_date', '>=', '2024-01-02')])
+        self.assertEqual(sorted(trades['pnl'].tolist()), [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(trades['status'].tolist()[:2], ['SL-HIT', '0'])
+
+    def test_empty(self):
+        self.assertEqual(len(self.archive.read(PARAMS_DATASET, columns=['scrip'])), 0)
+        # Archive root is a file - archiving fails without failing the caller
+        with tempfile.NamedTemporaryFile() as f:
+            self.assertIsNone(TradeArchive(path=f.name).safe_write(PARAMS_DATASET, pd.DataFrame({'a': [1]}),
+                                                                  trade_date='2024-01-01', acct='A'))
+
+
+if __name__ == "__main__":
+    unittest.main()
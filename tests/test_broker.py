@@ -0,0 +1,81 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from exec.service.broker import TokenBucketLimiter, ThrottledBroker, SQUARE_OFF, ENTRY, SL_TRAIL, DIAGNOSTIC
+
+
+class TestBroker(unittest.TestCase):
+
+    def test_priority_order(self):
+        limiter = TokenBucketLimiter(rate=50, burst=1)
+        self.assertTrue(limiter.acquire(ENTRY))
+
+        granted = []
+
+        def call(priority):
+            if limiter.acquire(priority):
+                granted.append(priority)
+
+        threads = [threading.Thread(target=call, args=(priority,)) for priority in [DIAGNOSTIC, SL_TRAIL, ENTRY]]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.002)
+        close = threading.Thread(target=call, args=(SQUARE_OFF,))
+        close.start()
+        for thread in threads + [close]:
+            thread.join()
+
+        self.assertEqual(granted[-1], DIAGNOSTIC)
+        self.assertEqual(sorted(granted), [SQUARE_OFF, ENTRY, SL_TRAIL, DIAGNOSTIC])
+        self.assertEqual(limiter.metrics()['ENTRY']['granted'], 2)
+
+    def test_shed_and_coalesce(self):
+        limiter = TokenBucketLimiter(rate=20, burst=1, shed_queue_depth={DIAGNOSTIC: 0})
+        self.assertTrue(limiter.acquire(ENTRY))
+        self.assertFalse(limiter.acquire(DIAGNOSTIC))
+
+        results = {}
+
+        def modify(name):
+            results[name] = limiter.acquire(SL_TRAIL, key="23112400485195")
+
+        first = threading.Thread(target=modify, args=("first",))
+        first.start()
+        time.sleep(0.01)
+        modify("second")
+        first.join()
+
+        self.assertEqual(results, {"first": False, "second": True})
+        metrics = limiter.metrics()
+        self.assertEqual(metrics['DIAGNOSTIC']['shed'], 1)
+        self.assertEqual(metrics['SL_TRAIL']['coalesced'], 1)
+
+    def test_no_shed(self):
+        limiter = TokenBucketLimiter(rate=50, burst=1, shed_queue_depth={DIAGNOSTIC: 0})
+        self.assertTrue(limiter.acquire(ENTRY))
+        self.assertTrue(limiter.acquire(DIAGNOSTIC, shed=False))
+        self.assertEqual(limiter.metrics()['DIAGNOSTIC']['shed'], 0)
+
+    def test_throttled_broker(self):
+        broker = Mock()
+        broker.acct = "Trader-V2-Pralhad"
+        limiter = Mock()
+        limiter.acquire.return_value = False
+        api = ThrottledBroker(broker, limiter)
+
+        self.assertIsNone(api.api_modify_order(order_no="23112400485195", new_trigger_price=208.65))
+        broker.api_modify_order.assert_not_called()
+        limiter.acquire.assert_called_with(SL_TRAIL, key="23112400485195", shed=True)
+
+        # Never shed - a None order book / order history is taken as no orders / fails the SL check
+        limiter.acquire.return_value = True
+        api.api_get_order_book()
+        limiter.acquire.assert_called_with(DIAGNOSTIC, key=None, shed=False)
+        api.is_sl_update_rejected("23112400485195")
+        limiter.acquire.assert_called_with(DIAGNOSTIC, key=None, shed=False)
+
+        api.api_login()
+        broker.api_login.assert_called_once()
+        self.assertEqual(api.acct, "Trader-V2-Pralhad")
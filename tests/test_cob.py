@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+from commons.consts.consts import PARAMS_HIST, TRADE_LOG
+
+from exec.service.cob import run_cob_accuracy, CloseOfBusiness, STAGES
+from exec.service.cob_ledger import StageLedger
+
+
+class FakeFastBT:
+
+    def __init__(self, exec_mode):
+        self.exec_mode = exec_mode
+
+    def run_cob_accuracy(self, params):
+        trades = pd.DataFrame({'scrip': params['scrip'], 'strategy': params['model'], 'pnl': params['target']})
+        mtm = {f"{row.scrip}:{row.model}": pd.DataFrame({'scrip': [row.scrip], 'mtm': [1.0]})
+               for row in params.itertuples()}
+        return trades, len(params), mtm
+
+
+class TestCob(unittest.TestCase):
+
+    @patch('exec.service.cob.FastBT', FakeFastBT)
+    def test_run_cob_accuracy(self):
+        params = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL', 'NSE_ONGC', 'NSE_WIPRO'],
+                               'model': ['trainer.strategies.rfcV2', 'trainer.strategies.rfcV2',
+                                         'trainer.strategies.gspcV2', 'trainer.strategies.rfcV2'],
+                               'target': [1.0, 2.0, 3.0, 4.0]})
+        serial_trades, serial_stats, serial_mtm = run_cob_accuracy(params, exec_mode="LOCAL", workers=1)
+        self.assertEqual(serial_stats, [4])
+        bt_trades, stats, bt_mtm = run_cob_accuracy(params, exec_mode="LOCAL", workers=2)
+        self.assertEqual(sorted(bt_trades['pnl'].tolist()), sorted(serial_trades['pnl'].tolist()))
+        self.assertEqual(sorted(bt_mtm.keys()), sorted(serial_mtm.keys()))
+        self.assertEqual(sorted(stats), [1, 1, 2])
+
+    def test_run_cob_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = StageLedger(os.path.join(tmp, 'cob-ledger.json'))
+            trader_db = MagicMock()
+            tables = {PARAMS_HIST: pd.DataFrame({'scrip': ['NSE_ONGC'], 'model': ['rfcV2']}),
+                      TRADE_LOG: pd.DataFrame({'scrip': ['NSE_ONGC'], 'trade_type': ['BROKER']})}
+            trader_db.query_df.side_effect = lambda table, predicate: tables[table]
+            cob = CloseOfBusiness(trader_db=trader_db, db=MagicMock(), archive=MagicMock(), ledger=ledger)
+            cob.ls = MagicMock()
+            cob.params = pd.DataFrame({'scrip': ['NSE_ONGC'], 'model': ['rfcV2'], 'target': [1.0]})
+            cob.shoonya = MagicMock()
+            cob.shoonya.api_get_order_book.return_value = [{'norenordno': '1', 'status': 'COMPLETE'}]
+            cob.sds = MagicMock()
+            stages = {'setup': MagicMock(),
+                      'store_params': MagicMock(return_value=True),
+                      # No orders yet, then stored
+                      'store_broker_trades': MagicMock(side_effect=[False] + [True] * 5),
+                      'store_bt_trades': MagicMock(side_effect=[RuntimeError("No tick data")] + [True] * 5),
+                      'reconcile': MagicMock(return_value=pd.DataFrame({'status': ['MATCHED']}))}
+
+            def calls():
+                return [stages[stage].call_count for stage in STAGES]
+
+            with patch.multiple(cob, **stages):
+                with self.assertRaises(RuntimeError):
+                    cob.run_cob('acct', cob_date='2024-01-01')
+                self.assertEqual(calls(), [1, 1, 1, 0])
+
+                # Resumes with the incomplete & failed stages
+                cob.run_cob('acct', cob_date='2024-01-01')
+                self.assertEqual(calls(), [1, 2, 2, 1])
+
+                self.assertEqual(stages['setup'].call_count, 2)
+
+                # Nothing to do - no setup (broker session & tick service) either
+                cob.run_cob('acct', cob_date='2024-01-01')
+                self.assertEqual(calls(), [1, 2, 2, 1])
+                self.assertEqual(stages['setup'].call_count, 2)
+
+                # Only the stages whose own inputs changed
+                tables[TRADE_LOG] = pd.DataFrame({'scrip': ['NSE_ONGC'] * 2, 'trade_type': ['BROKER', 'BACKTEST']})
+                cob.run_cob('acct', cob_date='2024-01-01')
+                self.assertEqual(calls(), [1, 2, 2, 2])
+                self.assertEqual(stages['setup'].call_count, 2)
+                # The backtest needs the setup
+                tables[PARAMS_HIST] = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'model': ['rfcV2'] * 2})
+                cob.run_cob('acct', cob_date='2024-01-01')
+                self.assertEqual(calls(), [1, 2, 3, 2])
+                self.assertEqual(stages['setup'].call_count, 3)
+
+                cob.run_cob('acct', cob_date='2024-01-01', force=True)
+                self.assertEqual(calls(), [2, 3, 4, 3])
+                self.assertEqual(stages['setup'].call_count, 4)
+            # The ticks are not loaded to fingerprint the backtest
+            cob.sds.load_scrips_data.assert_not_called()
+
+    def test_reconcile_archive_failure(self):
+        archive = MagicMock()
+        archive.write.side_effect = OSError("Disk full")
+        cob = CloseOfBusiness(trader_db=MagicMock(), db=MagicMock(), archive=archive)
+        trades = pd.DataFrame({'acct': 'acct', 'trade_date': '2024-01-01', 'scrip': ['NSE_ONGC'] * 2,
+                               'model': 'rfcV2', 'signal': 1, 'quantity': 1, 'entry_time': 1000,
+                               'entry_price': 100.0, 'exit_time': 2000, 'exit_price': 101.0, 'pnl': 1.0,
+                               'trade_type': ['BROKER', 'BACKTEST']})
+        with self.assertRaises(OSError):
+            cob.reconcile(acct='acct', cob_date='2024-01-01', trades=trades)
+
+
+if __name__ == "__main__":
+    unittest.main()
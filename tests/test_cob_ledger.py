@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from exec.service.cob_ledger import StageLedger, fingerprint, DONE, FAILED, INCOMPLETE
+
+
+class TestStageLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cob-ledger.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprint(self):
+        params = pd.DataFrame({'scrip': ['NSE_ONGC'], 'target': [1.0]})
+        self.assertEqual(fingerprint('acct', params), fingerprint('acct', params.copy()))
+        self.assertNotEqual(fingerprint('acct', params), fingerprint('acct', params.assign(target=2.0)))
+        self.assertNotEqual(fingerprint('acct', params), fingerprint('other', params))
+
+    def test_done_and_failed(self):
+        ledger = StageLedger(self.path)
+        self.assertFalse(ledger.is_done('acct', '2024-01-01', 'store_params', 'fp1'))
+        ledger.mark_done('acct', '2024-01-01', 'store_params', 'fp1')
+        ledger.mark_failed('acct', '2024-01-01', 'store_bt_trades', 'fp1', 'boom')
+        ledger.mark_incomplete('acct', '2024-01-01', 'store_broker_trades', 'fp1')
+
+        # Re-read from the file
+        ledger = StageLedger(self.path)
+        self.assertTrue(ledger.is_done('acct', '2024-01-01', 'store_params', 'fp1'))
+        self.assertFalse(ledger.is_done('acct', '2024-01-01', 'store_params', 'fp2'))
+        self.assertFalse(ledger.is_done('acct', '2024-01-01', 'store_params', None))
+        self.assertFalse(ledger.is_done('acct', '2024-01-01', 'store_bt_trades', 'fp1'))
+        self.assertEqual(ledger.get('acct', '2024-01-01', 'store_params')['status'], DONE)
+        self.assertEqual(ledger.get('acct', '2024-01-01', 'store_bt_trades')['status'], FAILED)
+        self.assertEqual(ledger.get('acct', '2024-01-01', 'store_bt_trades')['error'], 'boom')
+        self.assertFalse(ledger.is_done('acct', '2024-01-01', 'store_broker_trades', 'fp1'))
+        self.assertEqual(ledger.get('acct', '2024-01-01', 'store_broker_trades')['status'], INCOMPLETE)
+
+    def test_unreadable_ledger(self):
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        ledger = StageLedger(self.path)
+        self.assertIsNone(ledger.get('acct', '2024-01-01', 'store_params'))
+        ledger.mark_done('acct', '2024-01-01', 'store_params', 'fp1')
+        self.assertTrue(StageLedger(self.path).is_done('acct', '2024-01-01', 'store_params', 'fp1'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+from sqlalchemy import text
+
+from exec.service.db import TraderDb
+
+
+class TestTraderDb(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db = TraderDb(url=f"sqlite:///{os.path.join(self.dir.name, 'trader.db')}")
+        with self.db.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE params_hist (acct TEXT, trade_date TEXT, scrip TEXT NOT NULL, "
+                              "quantity INTEGER)"))
+
+    def tearDown(self):
+        self.db.dispose()
+        self.dir.cleanup()
+
+    def __rows(self, **filters):
+        with self.db.unit_of_work() as uow:
+            return uow.query_df('ParamsHist', **filters)
+
+    def test_replace(self):
+        day1 = pd.DataFrame({'acct': ['A', 'A'], 'trade_date': ['2024-01-01'] * 2, 'scrip': ['NSE_ONGC', 'NSE_BPCL'],
+                             'quantity': [1, 2], 'extra': [0, 0]})
+        with self.db.unit_of_work() as uow:
+            uow.replace_recs('params_hist', data=day1, acct='A', trade_date='2024-01-01')
+            uow.replace_recs('params_hist', data=day1.assign(acct='B'), acct='B', trade_date='2024-01-01')
+        with self.db.unit_of_work() as uow:
+            uow.replace_recs('params_hist', data=day1.iloc[:1], acct='A', trade_date='2024-01-01')
+        self.assertEqual(len(self.__rows(acct='A')), 1)
+        self.assertEqual(len(self.__rows(acct='B')), 2)
+
+    def test_rollback(self):
+        day1 = pd.DataFrame({'acct': ['A'], 'trade_date': ['2024-01-01'], 'scrip': ['NSE_ONGC'], 'quantity': [1]})
+        with self.db.unit_of_work() as uow:
+            uow.bulk_insert('params_hist', day1)
+        bad = day1.assign(scrip=None)
+        with self.assertRaises(Exception):
+            with self.db.unit_of_work() as uow:
+                uow.replace_recs('params_hist', data=bad, acct='A', trade_date='2024-01-01')
+        # Delete is rolled back along with the failed insert
+        self.assertEqual(self.__rows(acct='A')['scrip'].tolist(), ['NSE_ONGC'])
+
+    def test_unknown_table(self):
+        with self.assertRaises(ValueError):
+            self.db.table('trade_log')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,6 +21,7 @@ os.environ["RESOURCE_PATH"] = os.path.join(REPO_DIR, "resources/config")
 
 from exec.service import engine
 from exec.utils.ParamBuilder import load_params
+from exec.utils.ParamsSchema import enforce_params_schema
 
 sm = engine
 
@@ -171,9 +172,7 @@ class TestEngine(unittest.TestCase):
         expected_params['entry_price'] = expected_params['entry_price'].astype(float)
         expected_params['sl_price'] = expected_params['sl_price'].astype(float)
         expected_params['target_price'] = expected_params['target_price'].astype(float)
-        actual_params['entry_ts'] = actual_params['entry_ts'].astype(float)
-        actual_params['sl_ts'] = actual_params['sl_ts'].astype(float)
-        actual_params['target_ts'] = actual_params['target_ts'].astype(float)
+        expected_params = enforce_params_schema(expected_params)
         return actual_params, expected_params
 
     @patch.dict('exec.utils.ParamBuilder.cfg', {"generated": os.path.join(TEST_RESOURCE_DIR, 'create_bo')})
@@ -0,0 +1,116 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+import yaml
+
+from exec.service.kill_switch import KillSwitch, get_kill_switch_limits
+from exec.service.mtm import LiveMtm
+
+
+class TestKillSwitch(unittest.TestCase):
+
+    def test_limits(self):
+        conf = {'kill-switch': {'defaults': {'max_loss': 100, 'max_orders_per_minute': 5},
+                                'accounts': {'Trader-V2-Mahi': {'max_loss': 50}}}}
+        with patch.dict('exec.service.kill_switch.cfg', conf):
+            self.assertEqual(get_kill_switch_limits('Trader-V2-Mahi'), {'max_loss': 50, 'max_orders_per_minute': 5})
+            self.assertEqual(get_kill_switch_limits('Trader-V2-Alan'), {'max_loss': 100, 'max_orders_per_minute': 5})
+
+    def test_shipped_limits(self):
+        with open(os.path.join(os.path.dirname(__file__), '..', 'resources/config/risk-params.yaml')) as f:
+            conf = yaml.safe_load(f)
+        # No account is limited by a blanket default
+        self.assertTrue(all(limit is None for limit in conf['kill-switch']['defaults'].values()))
+        with patch.dict('exec.service.kill_switch.cfg', conf):
+            self.assertEqual(KillSwitch(limits=get_kill_switch_limits('Trader-V2-Alan')).max_loss, None)
+            kill_switch = KillSwitch(limits=get_kill_switch_limits('Trader-V2-Mahi'))
+            self.assertEqual((kill_switch.max_loss, kill_switch.max_open_notional, kill_switch.max_orders_per_minute),
+                             (2000, 200000, 20))
+
+    def test_max_loss(self):
+        kill_switch = KillSwitch(acct='Trader-V2-Pralhad', limits={'max_loss': 100, 'max_open_notional': 2000})
+        mtm = LiveMtm()
+        mtm.add_listener(kill_switch.on_mtm)
+        mtm.on_fill(0, '2263', 1, 10, 100.0)
+        self.assertTrue(kill_switch.allow_entry(1, notional=500))
+        # Would breach the open notional
+        self.assertFalse(kill_switch.allow_entry(2, notional=1500))
+        mtm.on_tick('2263', 95.0)
+        self.assertFalse(kill_switch.tripped)
+        mtm.on_tick('2263', 90.0)
+        self.assertTrue(kill_switch.tripped)
+        self.assertFalse(kill_switch.allow_entry(3))
+        self.assertEqual(kill_switch.status()['pnl'], -100.0)
+
+    def test_orders_per_minute(self):
+        kill_switch = KillSwitch(limits={'max_orders_per_minute': 2})
+        for idx in range(2):
+            self.assertTrue(kill_switch.allow_entry(idx))
+            kill_switch.on_order(idx)
+        self.assertFalse(kill_switch.allow_entry(2))
+        self.assertFalse(kill_switch.tripped)
+        # Placed outside the gate
+        kill_switch.on_order(2)
+        self.assertTrue(kill_switch.tripped)
+
+    def test_order_not_placed(self):
+        kill_switch = KillSwitch(limits={'max_orders_per_minute': 1, 'max_open_notional': 1000})
+        self.assertTrue(kill_switch.allow_entry(0, notional=1000))
+        kill_switch.on_order(0, placed=False)
+        # Neither the slot nor the notional is held
+        self.assertEqual(kill_switch.status()['orders_last_minute'], 0)
+        self.assertTrue(kill_switch.allow_entry(1, notional=1000))
+        kill_switch.on_order(1)
+        self.assertFalse(kill_switch.tripped)
+
+    def test_fill_after_order(self):
+        kill_switch = KillSwitch(limits={'max_open_notional': 1500})
+        mtm = LiveMtm()
+        mtm.add_listener(kill_switch.on_mtm)
+        # Burst of entries ahead of their fills
+        allowed = []
+        for idx in range(4):
+            allowed.append(kill_switch.allow_entry(idx, notional=1000))
+            if allowed[-1]:
+                kill_switch.on_order(idx)
+        self.assertEqual(allowed, [True, False, False, False])
+
+        # Fill lands - the reservation moves into the MTM open notional
+        mtm.on_fill(0, '2263', 1, 10, 100.0)
+        kill_switch.release(0)
+        self.assertEqual(kill_switch.reserved_notional, 0.0)
+        self.assertFalse(kill_switch.allow_entry(1, notional=1000))
+        self.assertTrue(kill_switch.allow_entry(1, notional=500))
+        # Rejected entry frees its headroom
+        kill_switch.on_order(1)
+        kill_switch.release(1)
+        self.assertTrue(kill_switch.allow_entry(2, notional=500))
+        self.assertFalse(kill_switch.tripped)
+
+    def test_concurrent_entries(self):
+        kill_switch = KillSwitch(limits={'max_orders_per_minute': 5, 'max_open_notional': 3000})
+        barrier = threading.Barrier(8)
+        allowed = []
+
+        def entry(idx):
+            barrier.wait()
+            allowed.append((idx, kill_switch.allow_entry(idx, notional=1000)))
+
+        threads = [threading.Thread(target=entry, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Reserved notional bounds the concurrent entries
+        placed = [idx for idx, ok in allowed if ok]
+        self.assertEqual(len(placed), 3)
+        for idx in placed:
+            kill_switch.on_order(idx)
+        self.assertEqual(kill_switch.reserved_notional, 3000.0)
+        self.assertEqual(kill_switch.status()['orders_last_minute'], 3)
+        self.assertFalse(kill_switch.tripped)
+
+if __name__ == "__main__":
+    unittest.main()
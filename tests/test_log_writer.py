@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+import pandas as pd
+
+from exec.service.log_writer import AsyncLogService
+
+
+class BlockingLogService:
+
+    def __init__(self):
+        self.entries = []
+        self.release = threading.Event()
+
+    def log_entry(self, **kwargs):
+        self.release.wait(5)
+        if kwargs.get('log_type') == 'ERROR':
+            raise ValueError("Write failed")
+        self.entries.append(kwargs)
+
+
+class TestAsyncLogService(unittest.TestCase):
+
+    def test_sync_till_started(self):
+        log_service = BlockingLogService()
+        log_service.release.set()
+        ls = AsyncLogService(log_service)
+        ls.log_entry(log_type='Params', keys=['BOD'], data=pd.DataFrame({'a': [1]}), acct='Trader-V2-Pralhad')
+        self.assertEqual(len(log_service.entries), 1)
+
+    def test_background_flush(self):
+        log_service = BlockingLogService()
+        ls = AsyncLogService(log_service, max_queue=2)
+        ls.start()
+        params = pd.DataFrame({'a': [1, 2]})
+        ls.log_entry(log_type='Params', keys=['Post-BOD'], data=params, acct='Trader-V2-Pralhad')
+        # Snapshot is taken at enqueue
+        params.loc[0, 'a'] = 10
+        ls.log_entry(log_type='ERROR', keys=['COB'], data=None, acct='Trader-V2-Pralhad')
+        ls.log_entry(log_type='Params', keys=['Pre-COB'], data=params, acct='Trader-V2-Pralhad')
+        self.assertEqual(len(log_service.entries), 0)
+
+        log_service.release.set()
+        ls.stop()
+        self.assertEqual([entry['keys'] for entry in log_service.entries], [['Post-BOD'], ['Pre-COB']])
+        self.assertEqual(log_service.entries[0]['data']['a'].tolist(), [1, 2])
+        self.assertEqual(ls.stats['written'], 2)
+        self.assertEqual(ls.stats['errors'], 1)
+
+    def test_merge(self):
+        entries = [{'log_type': 'ERROR', 'keys': ['COB'], 'data': None, 'acct': 'Trader-V2-Pralhad'}]
+        entries += [{'log_type': 'Trades', 'keys': ['COB'], 'data': pd.DataFrame({'a': [val]}), 'acct': acct,
+                     'log_date': '2023-11-24'}
+                    for val, acct in enumerate(['Trader-V2-Pralhad', 'Trader-V2-Mahi', 'Trader-V2-Pralhad'])]
+        writes = AsyncLogService.merge(entries)
+        self.assertEqual([(entry['log_type'], entry['acct']) for entry in writes],
+                         [('ERROR', 'Trader-V2-Pralhad'), ('Trades', 'Trader-V2-Pralhad'),
+                          ('Trades', 'Trader-V2-Mahi')])
+        self.assertEqual(writes[1]['data']['a'].tolist(), [0, 2])
+        self.assertEqual(writes[2]['data']['a'].tolist(), [1])
+
+    def test_stop_with_blocked_callers(self):
+        log_service = BlockingLogService()
+        ls = AsyncLogService(log_service, max_queue=1, max_batch=1)
+        ls.start()
+        callers = [threading.Thread(target=ls.log_entry, kwargs={'log_type': 'Params', 'keys': [str(val)],
+                                                                 'data': None, 'acct': 'Trader-V2-Pralhad'})
+                   for val in range(4)]
+        for caller in callers:
+            caller.start()
+        stopper = threading.Thread(target=ls.stop)
+        stopper.start()
+        log_service.release.set()
+        stopper.join(5)
+        for caller in callers:
+            caller.join(5)
+        self.assertFalse(stopper.is_alive())
+        self.assertEqual(len(log_service.entries), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import pandas as pd
+
+from exec.service.mtm import LiveMtm
+
+
+class TestLiveMtm(unittest.TestCase):
+
+    def test_incremental(self):
+        mtm = LiveMtm(acct='Trader-V2-Pralhad', publish_interval=0)
+        updates = []
+        mtm.add_listener(lambda realized, unrealized, notional: updates.append((realized, unrealized, notional)))
+
+        mtm.on_fill(0, '2263', 1, 10, 100.0)
+        mtm.on_fill(1, '2263', -1, 5, 102.0)
+        mtm.on_fill(2, '3351', 1, 2, 50.0)
+        # Duplicate fill is ignored
+        mtm.on_fill(0, '2263', 1, 10, 100.0)
+        self.assertEqual(mtm.open_notional, 1000.0 + 510.0 + 100.0)
+
+        mtm.on_tick('2263', 104.0)
+        mtm.on_tick('9999', 10.0)
+        self.assertAlmostEqual(mtm.unrealized, 10 * 4.0 - 5 * 2.0)
+        mtm.on_tick('3351', 49.0)
+        self.assertAlmostEqual(mtm.unrealized, 10 * 4.0 - 5 * 2.0 - 2.0)
+
+        mtm.on_exit(1, 101.0)
+        mtm.on_exit(1, 90.0)
+        self.assertAlmostEqual(mtm.realized, 5.0)
+        self.assertAlmostEqual(mtm.unrealized, 40.0 - 2.0)
+        self.assertEqual(mtm.open_notional, 1100.0)
+
+        snapshot = mtm.publish()
+        self.assertAlmostEqual(snapshot['pnl'], 43.0)
+        self.assertAlmostEqual(snapshot['rows'][0]['unrealized'], 40.0)
+        self.assertAlmostEqual(snapshot['rows'][1]['realized'], 5.0)
+        self.assertAlmostEqual(snapshot['tokens']['2263']['unrealized'], 40.0)
+        self.assertEqual(updates[-1], (mtm.realized, mtm.unrealized, mtm.open_notional))
+
+    def test_load(self):
+        params = pd.DataFrame({
+            'token': ['2263', '2263', '3351'],
+            'signal': [1, -1, 1],
+            'quantity': [10, 5, 2],
+            'entry_price': [100.0, 102.0, None],
+            'entry_order_status': ['ENTERED', 'ENTERED', 'REJECTED'],
+            'sl_order_status': ['SL-HIT', 'TRIGGER_PENDING', None],
+            'sl_price': [99.0, 105.0, None],
+            'target_order_status': [None, 'OPEN', None],
+            'target_price': [105.0, 99.0, None]
+        })
+        mtm = LiveMtm()
+        mtm.load(params)
+        self.assertEqual(sorted(mtm.rows.keys()), [0, 1])
+        self.assertAlmostEqual(mtm.realized, -10.0)
+        self.assertEqual(mtm.open_notional, 510.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import copy
+import unittest
+from unittest.mock import Mock
+
+from tests.Utils import read_file
+
+from exec.service.order_updates import OrderUpdatePipeline
+from exec.service.status import LatencyHistogram
+
+
+class TestOrderUpdatePipeline(unittest.TestCase):
+
+    def test_bo_entry_burst(self):
+        handler = Mock()
+        pipeline = OrderUpdatePipeline(handler=handler)
+
+        recs = read_file("order_update/1-bo-entry-order-update.json")
+        pipeline.latency = LatencyHistogram()
+        applied = pipeline.process(recs + copy.deepcopy(recs))
+        self.assertEqual(pipeline.latency.snapshot()['count'], applied)
+
+        # One update per leg i.e. Entry, SL & Target
+        self.assertEqual(applied, 3)
+        self.assertEqual(pipeline.stats['duplicate'], len(recs))
+        statuses = {args[0]['norenordno']: args[0]['status'] for args, _ in handler.call_args_list}
+        self.assertEqual(statuses, {'23112400485194': 'COMPLETE',
+                                    '23112400485195': 'TRIGGER_PENDING',
+                                    '23112400485196': 'OPEN'})
+
+    def test_out_of_order_updates(self):
+        handler = Mock()
+        pipeline = OrderUpdatePipeline(handler=handler)
+
+        sl_hit = read_file("order_update/4-sl-hit-order-update.json")
+        sl_update = read_file("order_update/2-sl-update-order-update.json")
+
+        # Same burst - latest exchange time wins irrespective of arrival
+        pipeline.process([sl_hit, sl_update])
+        self.assertEqual(handler.call_args.args[0]['status'], 'COMPLETE')
+
+        # Later burst carrying an older update is stale
+        pipeline.process([dict(sl_update, reporttype='Replaced-Late')])
+        self.assertEqual(handler.call_count, 1)
+        self.assertEqual(pipeline.stats['stale'], 1)
+
+    def test_same_second_modifies(self):
+        handler = Mock()
+        pipeline = OrderUpdatePipeline(handler=handler)
+
+        sl_update = read_file("order_update/2-sl-update-order-update.json")
+        first = dict(sl_update, reporttype='Replaced', trgprc='193.50')
+        second = dict(first, trgprc='194.00')
+        pipeline.process([first])
+        pipeline.process([second])
+        self.assertEqual(pipeline.stats['duplicate'], 0)
+        self.assertEqual([args[0]['trgprc'] for args, _ in handler.call_args_list], ['193.50', '194.00'])
+
+        # Redelivery of the second is still a duplicate
+        pipeline.process([dict(second)])
+        self.assertEqual(pipeline.stats['duplicate'], 1)
+
+    def test_dedup_window(self):
+        handler = Mock()
+        pipeline = OrderUpdatePipeline(handler=handler, dedup_ttl=60.0, dedup_max_keys=2)
+
+        sl_update = read_file("order_update/2-sl-update-order-update.json")
+        # Fields outside the transition (e.g. a re-sent ack's extras) don't make it a new update
+        pipeline.process([sl_update, dict(sl_update, rejreason='')])
+        self.assertEqual(pipeline.stats['duplicate'], 1)
+        self.assertEqual(handler.call_count, 1)
+
+        # Bounded - the oldest key is evicted by newer ones
+        pipeline.process([dict(sl_update, norenordno='1'), dict(sl_update, norenordno='2')])
+        self.assertEqual(len(pipeline.seen), 2)
+        self.assertNotIn(pipeline.message_key(sl_update), pipeline.seen)
+
+        # Expired keys are dropped
+        pipeline.dedup_ttl = -1.0
+        pipeline.submit(dict(sl_update, norenordno='1'))
+        self.assertEqual(pipeline.stats['duplicate'], 1)
+        self.assertEqual(len(pipeline.seen), 1)
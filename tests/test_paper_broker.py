@@ -0,0 +1,109 @@
+import unittest
+
+import pandas as pd
+
+from exec.service.paper_broker import PaperBroker
+
+
+class FakeBroker:
+
+    def __init__(self):
+        self.callbacks = None
+
+    def api_login(self):
+        return 'Ok'
+
+    def api_start_websocket(self, **callbacks):
+        self.callbacks = callbacks
+
+
+class TestPaperBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.api = PaperBroker(self.broker, order_no_start=1)
+        self.api.register_instruments(pd.DataFrame({'exchange': ['NSE', 'NSE'], 'symbol': ['ONGC-EQ', 'BPCL-EQ'],
+                                                    'token': ['2475', '526']}))
+        self.updates = []
+        self.quotes = []
+        self.api.api_start_websocket(subscribe_callback=self.quotes.append, socket_open_callback=None,
+                                     socket_error_callback=None, order_update_callback=self.updates.append)
+
+    def __place(self, buy_or_sell='B', symbol='ONGC-EQ'):
+        return self.api.api_place_order(buy_or_sell=buy_or_sell, product_type='B', exchange='NSE',
+                                        trading_symbol=symbol, quantity=2, disclose_qty=0, price_type='MKT',
+                                        price=0.00, trigger_price=None, retention='DAY',
+                                        remarks='BO:trainer.strategies.rfcV2:NSE_ONGC:0', book_loss_price=2.0,
+                                        book_profit_price=3.0)
+
+    def __tick(self, ltp, token='2475'):
+        self.broker.callbacks['subscribe_callback']({'tk': token, 'lp': str(ltp)})
+
+    def __statuses(self):
+        return [(update['norenordno'], update['status'], update.get('snoordt')) for update in self.updates]
+
+    def test_entry_and_target(self):
+        resp = self.__place()
+        self.assertEqual(resp['norenordno'], '1')
+        self.assertEqual(self.__statuses(), [('1', 'OPEN', None)])
+        self.__tick(100.0, token='526')
+        self.assertEqual(len(self.updates), 1)
+
+        self.__tick(100.0)
+        self.assertEqual(self.__statuses()[1:], [('1', 'COMPLETE', None), ('2', 'TRIGGER_PENDING', '1'),
+                                                 ('3', 'OPEN', '0')])
+        self.assertEqual(self.updates[1]['avgprc'], '100.00')
+        self.assertEqual(self.updates[2]['trgprc'], '98.00')
+        self.assertEqual(self.updates[3]['prc'], '103.00')
+        self.assertEqual(self.updates[2]['trantype'], 'S')
+
+        self.__tick(102.0)
+        self.assertEqual(len(self.updates), 4)
+        self.__tick(103.5)
+        self.assertEqual(self.__statuses()[4:], [('2', 'CANCELED', '1'), ('3', 'COMPLETE', '0')])
+        self.assertEqual(self.updates[5]['avgprc'], '103.00')
+        # Quotes reach the engine
+        self.assertEqual(len(self.quotes), 4)
+        self.assertIsNone(self.api.api_close_bracket_order(order_no='1'))
+
+    def test_trail_and_sl_hit(self):
+        self.__place(buy_or_sell='S')
+        self.__tick(100.0)
+        self.assertEqual(self.updates[2]['trgprc'], '102.00')
+        self.assertIsNotNone(self.api.api_modify_order(exchange='NSE', trading_symbol='ONGC-EQ', order_no='2',
+                                                       new_quantity=2, new_price_type='SL-MKT',
+                                                       new_trigger_price=101.0))
+        self.assertEqual(self.__statuses()[-1], ('2', 'TRIGGER_PENDING', '1'))
+        self.assertEqual(self.updates[-1]['trgprc'], '101.00')
+        self.assertIsNone(self.api.api_modify_order(exchange='NSE', trading_symbol='ONGC-EQ', order_no='3',
+                                                    new_quantity=2, new_price_type='SL-MKT',
+                                                    new_trigger_price=101.0))
+        self.__tick(101.2)
+        self.assertEqual(self.__statuses()[-2:], [('3', 'CANCELED', '0'), ('2', 'COMPLETE', '1')])
+        self.assertEqual(self.updates[-1]['avgprc'], '101.20')
+        self.assertEqual(self.api.stats['sl_hit'], 1)
+
+    def test_close(self):
+        self.__place()
+        self.__tick(100.0)
+        self.__tick(101.0)
+        self.api.api_close_bracket_order(order_no='1')
+        self.assertEqual(self.__statuses()[-2:], [('2', 'CANCELED', '1'), ('3', 'COMPLETE', '0')])
+        self.assertEqual((self.updates[-1]['prc'], self.updates[-1]['avgprc']), ('0.00', '101.00'))
+
+        # Not yet filled
+        self.__place(symbol='BPCL-EQ')
+        self.api.api_close_bracket_order(order_no='4')
+        self.assertEqual(self.__statuses()[-1], ('4', 'CANCELED', None))
+        self.__tick(100.0, token='526')
+        self.assertEqual(self.__statuses()[-1], ('4', 'CANCELED', None))
+        self.assertEqual(len(self.api.api_get_order_book()), 4)
+
+    def test_unknown_instrument(self):
+        self.assertIsNone(self.__place(symbol='WIPRO-EQ'))
+        self.assertIsNone(self.api.api_get_order_book())
+        self.assertEqual(self.api.api_login(), 'Ok')
+
+
+if __name__ == "__main__":
+    unittest.main()
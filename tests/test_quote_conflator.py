@@ -0,0 +1,30 @@
+import unittest
+from unittest.mock import Mock
+
+from tests.Utils import read_file
+
+from exec.service.quote_conflator import QuoteConflator, RECV_TS
+
+
+class TestQuoteConflator(unittest.TestCase):
+
+    def test_conflation(self):
+        handler = Mock()
+        conflator = QuoteConflator(handler=handler)
+        quote = read_file("create_bo/quote-NSE_ONGC-valid.json")
+
+        conflator.submit(quote)
+        conflator.submit({"t": "tk", "tk": "2475", "lp": "191.50"})
+        # Depth only update - retains the latest LTP
+        conflator.submit({"t": "tk", "tk": "2475", "bp1": "191.45"})
+        conflator.submit({"t": "tk", "tk": "3351", "lp": "1196.00"})
+
+        self.assertEqual(conflator.drain(), 2)
+        ltps = {args[0]['tk']: args[0]['lp'] for args, _ in handler.call_args_list}
+        self.assertEqual(ltps, {"2475": "191.50", "3351": "1196.00"})
+        self.assertEqual(conflator.stats['conflated'], 2)
+        self.assertEqual(quote['lp'], "191.00")
+        # Receipt of the latest tick of the slot, the caller's quote is left as is
+        recv_ts = {args[0]['tk']: args[0][RECV_TS] for args, _ in handler.call_args_list}
+        self.assertLessEqual(recv_ts['2475'], recv_ts['3351'])
+        self.assertNotIn(RECV_TS, quote)
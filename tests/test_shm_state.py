@@ -0,0 +1,99 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from exec.service.shm_state import ShmStateWriter, ShmStateReader, read_all_states, to_frame, get_state_path, \
+    MAX_ROWS
+
+
+class TestShmState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.params = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'model': ['trainer.strategies.rfcV2'] * 2,
+                                    'token': ['2475', '526'], 'signal': [1, -1], 'quantity': [10, 5],
+                                    'active': ['Y', 'N'], 'entry_order_status': ['ENTERED', None],
+                                    'sl_order_status': ['TRIGGER_PENDING', None], 'target_order_status': [None, None],
+                                    'entry_price': [213.85, np.nan], 'sl_price': [210.5, np.nan],
+                                    'target_price': [np.nan, np.nan]})
+        self.mtm = {'realized': 0.0, 'unrealized': 11.5, 'open_notional': 2138.5,
+                    'tokens': {'2475': {'ltp': 215.0}}, 'rows': {0: {'realized': 0.0, 'unrealized': 11.5}}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def __writer(self, acct='Trader-V2-Pralhad'):
+        writer = ShmStateWriter(path=get_state_path(acct, self.tmp.name))
+        writer.open(acct)
+        return writer
+
+    def test_write_read(self):
+        writer = self.__writer()
+        writer.update(self.params, self.mtm, tripped=False)
+        reader = ShmStateReader(writer.path)
+        header, rows = reader.read()
+        self.assertEqual((header['acct'], header['rows'], header['alive']), ('Trader-V2-Pralhad', 2, True))
+        self.assertEqual(header['unrealized'], 11.5)
+        self.assertEqual(header['seq'] % 2, 0)
+        df = to_frame(rows)
+        self.assertEqual(df.loc[0, 'scrip'], 'NSE_ONGC')
+        self.assertEqual(df.loc[0, 'model'], 'trainer.strategies.rfcV2')
+        self.assertEqual(df.loc[0, 'sl_status'], 'TRIGGER_PENDING')
+        self.assertEqual((df.loc[0, 'ltp'], df.loc[0, 'unrealized'], df.loc[0, 'sl_price']), (215.0, 11.5, 210.5))
+        self.assertEqual((df.loc[1, 'signal'], df.loc[1, 'active'], df.loc[1, 'entry_status']), (-1, 'N', ''))
+        self.assertTrue(np.isnan(df.loc[1, 'ltp']))
+
+        # Fewer rows & the kill switch
+        writer.update(self.params.iloc[:1], self.mtm, tripped=True)
+        header, rows = reader.read()
+        self.assertEqual((header['rows'], header['tripped'], len(rows)), (1, 1, 1))
+
+        writer.close()
+        header, _ = reader.read()
+        self.assertFalse(header['alive'])
+        reader.close()
+
+    def test_read_all_states(self):
+        writers = [self.__writer(acct) for acct in ['Trader-V2-Pralhad', 'Trader-V2-Mahi']]
+        for writer in writers:
+            writer.update(self.params, self.mtm)
+        with open(os.path.join(self.tmp.name, 'trade-exec-junk.state'), 'wb') as f:
+            f.write(b'junk')
+        states = read_all_states(self.tmp.name)
+        self.assertEqual(sorted(states.keys()), ['Trader-V2-Mahi', 'Trader-V2-Pralhad'])
+        self.assertEqual(len(states['Trader-V2-Mahi'][1]), 2)
+        for writer in writers:
+            writer.close()
+
+    def test_consistent_reads(self):
+        writer = self.__writer()
+        params = pd.concat([self.params] * (MAX_ROWS // 2), ignore_index=True)
+        stop = threading.Event()
+
+        def write():
+            count = 1
+            while not stop.is_set():
+                writer.update(params.iloc[:count], self.mtm)
+                count = count % MAX_ROWS + 1
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        reader = ShmStateReader(writer.path)
+        try:
+            for _ in range(200):
+                header, rows = reader.read(retries=100000)
+                self.assertEqual(len(rows), header['rows'])
+                self.assertEqual(rows['idx'].tolist(), list(range(header['rows'])))
+        finally:
+            stop.set()
+            thread.join()
+            reader.close()
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
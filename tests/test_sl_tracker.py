@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import Mock
+
+from tests.Utils import read_file
+
+from exec.service.sl_tracker import SlModifyTracker, ACCEPTED, REJECTED, UNKNOWN
+
+
+class TestSlModifyTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.api = Mock()
+        self.api.is_sl_update_rejected.return_value = (True, "16448: undefined error code !!")
+        self.on_rejected = Mock()
+        self.tracker = SlModifyTracker(api=self.api, on_rejected=self.on_rejected)
+        self.update = read_file("order_update/2-sl-update-order-update.json")
+
+    def test_accepted_from_stream(self):
+        self.tracker.request("23112400485195", 0, 208.65)
+        self.assertEqual(self.tracker.on_update(0, self.update), ACCEPTED)
+        self.api.is_sl_update_rejected.assert_not_called()
+        self.on_rejected.assert_not_called()
+
+    def test_rejected_from_stream(self):
+        self.tracker.request("23112400485195", 0, 208.65)
+        update = dict(self.update, rejreason="16448: undefined error code !!")
+        self.assertEqual(self.tracker.on_update(0, update), REJECTED)
+        self.api.is_sl_update_rejected.assert_not_called()
+        self.on_rejected.assert_called_once_with(0, "23112400485195", "16448: undefined error code !!")
+
+    def test_ambiguous_falls_back_to_order_hist(self):
+        self.tracker.request("23112400485195", 0, 210.00)
+        self.assertEqual(self.tracker.on_update(0, self.update), UNKNOWN)
+        self.api.is_sl_update_rejected.assert_called_once_with("23112400485195")
+        self.on_rejected.assert_called_once()
+
+    def test_timeout(self):
+        self.tracker.timeout = -1
+        self.tracker.start()
+        self.tracker.request("23112400485195", 0, 208.65)
+        self.tracker.check_timeouts()
+        self.tracker.stop()
+        self.assertEqual(self.tracker.stats['timeout'], 1)
+        self.api.is_sl_update_rejected.assert_called_once_with("23112400485195")
+        self.assertEqual(self.tracker.requests, {})
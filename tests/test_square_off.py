@@ -0,0 +1,31 @@
+import unittest
+from unittest.mock import Mock
+
+from exec.service.square_off import SquareOffExecutor
+
+
+class TestSquareOffExecutor(unittest.TestCase):
+
+    def test_close_all_confirmed(self):
+        api = Mock()
+        executor = SquareOffExecutor(api=api, max_parallel=1, deadline=1)
+        api.api_close_bracket_order.side_effect = lambda order_no: executor.confirm(int(order_no[-1])) or {
+            "stat": "Ok"}
+
+        orders = [(0, "23112400485190", 100.0), (1, "23112400485191", 5000.0), (2, "23112400485192", 10.0)]
+        self.assertEqual(executor.close_all(orders), [])
+
+        closed = [kwargs['order_no'] for _, kwargs in api.api_close_bracket_order.call_args_list]
+        self.assertEqual(closed, ["23112400485191", "23112400485190", "23112400485192"])
+
+    def test_close_all_retry_and_escalate(self):
+        api = Mock()
+        api.api_close_bracket_order.return_value = None
+        on_escalate = Mock()
+        executor = SquareOffExecutor(api=api, deadline=0.01, max_attempts=2, on_escalate=on_escalate)
+
+        still_open = executor.close_all([(0, "23112400485190", 100.0)])
+
+        self.assertEqual(still_open, [(0, "23112400485190")])
+        self.assertEqual(api.api_close_bracket_order.call_count, 2)
+        on_escalate.assert_called_once_with([(0, "23112400485190")])
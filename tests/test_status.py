@@ -0,0 +1,82 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from exec.service.status import StatusPublisher, LatencyHistogram, build_status
+from exec.utils.ParamsSchema import enforce_params_schema
+
+
+class TestStatus(unittest.TestCase):
+
+    def __params(self):
+        params = pd.DataFrame({'scrip': ['NSE_ONGC', 'NSE_BPCL'], 'model': ['rfcV2', 'rfcV2'], 'signal': [1, -1],
+                               'quantity': [10, 5], 'token': ['2475', '526'], 'active': ['Y', 'N'],
+                               'entry_order_id': ['23112400485194', None], 'entry_order_status': ['ENTERED', None],
+                               'entry_price': [213.85, np.nan], 'entry_ts': [1700814305, None],
+                               'sl_order_id': ['23112400485195', None], 'sl_order_status': ['TRIGGER_PENDING', None],
+                               'sl_price': [210.5, np.nan], 'sl_ts': [1700814305, None],
+                               'target_order_id': [None, None], 'target_order_status': [None, None],
+                               'target_price': [np.nan, np.nan], 'target_ts': [None, None],
+                               'sl_update_cnt': [2, 0]})
+        return enforce_params_schema(params)
+
+    def test_build_status(self):
+        result = build_status(acct='acct', params=self.__params(), mtm={'pnl': 1.5}, metrics={'quotes': {}})
+        # JSON serialisable as is
+        result = json.loads(json.dumps(result))
+        self.assertEqual(result['active'], {'Y': 1, 'N': 1})
+        self.assertEqual(len(result['active_rows']), 1)
+        row = result['active_rows'][0]
+        self.assertEqual((row['idx'], row['scrip'], row['sl'], row['sl_update_cnt']), (0, 'NSE_ONGC', 210.5, 2))
+        self.assertEqual(row['legs']['entry'], {'order_id': 23112400485194, 'status': 'ENTERED', 'price': 213.85,
+                                                'ts': 1700814305})
+        self.assertEqual(row['legs']['target'], {'order_id': None, 'status': None, 'price': None, 'ts': None})
+        self.assertEqual(result['mtm'], {'pnl': 1.5})
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram(bounds_ms=[1, 10, 100])
+        self.assertIsNone(histogram.snapshot()['p50_ms'])
+        for secs in [0.0005] * 98 + [0.05, 0.5]:
+            histogram.record(secs)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['buckets'], {'<=1ms': 98, '<=10ms': 0, '<=100ms': 1, '>100ms': 1})
+        self.assertEqual((snapshot['count'], snapshot['p50_ms'], snapshot['p99_ms']), (100, 1.0, 100.0))
+        self.assertAlmostEqual(snapshot['max_ms'], 500.0)
+
+    def test_refresh_on_change(self):
+        publisher = StatusPublisher()
+        calls = []
+
+        def build():
+            calls.append(1)
+            return {'calls': len(calls)}
+
+        self.assertTrue(publisher.refresh(build))
+        self.assertFalse(publisher.refresh(build))
+        publisher.mark_changed()
+        self.assertTrue(publisher.refresh(build))
+        self.assertTrue(publisher.refresh(build, force=True))
+        self.assertEqual(json.loads(publisher.body), {'calls': 3})
+
+    def test_serve(self):
+        publisher = StatusPublisher(port=0)
+        publisher.refresh(lambda: build_status(acct='acct', params=self.__params()), force=True)
+        publisher.start()
+        try:
+            url = f"http://127.0.0.1:{publisher.port}"
+            with urllib.request.urlopen(f"{url}/status", timeout=5) as resp:
+                self.assertEqual(resp.headers['Content-Type'], 'application/json')
+                self.assertEqual(json.loads(resp.read())['acct'], 'acct')
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{url}/params", timeout=5)
+        finally:
+            publisher.stop()
+        self.assertIsNone(publisher.server)
+
+
+if __name__ == "__main__":
+    unittest.main()
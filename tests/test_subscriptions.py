@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import Mock
+
+import pandas as pd
+
+from exec.service.subscriptions import SubscriptionManager
+
+
+class TestSubscriptionManager(unittest.TestCase):
+
+    def test_lifecycle(self):
+        api = Mock()
+        manager = SubscriptionManager(api=api)
+        params = pd.DataFrame({
+            'exchange': ['NSE', 'NSE', 'NSE', 'NSE'],
+            'token': ['2263', '2263', '3351', '2475'],
+            'active': ['Y', 'N', 'Y', 'N']
+        })
+
+        # No-op till subscribed
+        manager.update(params, '2263')
+        api.api_subscribe.assert_not_called()
+
+        self.assertEqual(sorted(manager.subscribe(params)), ['NSE|2263', 'NSE|3351'])
+
+        params.loc[0, 'active'] = 'S'
+        manager.update(params, '2263')
+        api.api_unsubscribe.assert_called_once_with(['NSE|2263'])
+
+        # Restored
+        params.loc[1, 'active'] = 'Y'
+        manager.update(params, '2263')
+        api.api_subscribe.assert_called_with(['NSE|2263'])
+        self.assertEqual(manager.subscribed, {'NSE|2263', 'NSE|3351'})
+
+        manager.unsubscribe_all()
+        self.assertEqual(manager.subscribed, set())
+        self.assertEqual(manager.stats, {'subscribed': 3, 'unsubscribed': 3})
+
+    def test_open_position(self):
+        api = Mock()
+        manager = SubscriptionManager(api=api)
+        params = pd.DataFrame({
+            'exchange': ['NSE', 'NSE'],
+            'token': ['2263', '3351'],
+            'active': ['S', 'N'],
+            'entry_order_status': ['ENTERED', 'ENTERED'],
+            'sl_order_status': ['TRIGGER_PENDING', 'SL-HIT'],
+            'target_order_status': ['OPEN', 'CANCELED']
+        })
+
+        # SL rejected row with an open position keeps its token
+        self.assertEqual(manager.subscribe(params), ['NSE|2263'])
+        manager.update(params, '2263')
+        api.api_unsubscribe.assert_not_called()
+
+        params.loc[0, 'target_order_status'] = 'TARGET-HIT'
+        manager.update(params, '2263')
+        api.api_unsubscribe.assert_called_once_with(['NSE|2263'])